@@ -1,288 +1,352 @@
+import itertools
 import json
 import random
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 import os
 
-def generate_robust_finetuning():
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    output_file = os.path.join(BASE_DIR, 'dataset_finetuning_v2.jsonl')
-    
-    # SYSTEM PROMPT (O mesmo de Produção)
-    system_prompt = (
-        "Role: ClientaTech AI Analyst. "
-        "Task: Transform raw SQL data into a professional response based on user Intent. "
-        "Rules: "
-        "1. LANGUAGE: Portuguese (pt-BR). "
-        "2. IF DATA IS EMPTY: Respond 'Não encontrei registros correspondentes.' (Except Greeting). "
-        "3. PROFILE INTENT: Use the fixed 'Rich Card' format with emojis. "
-        "4. SEMANTIC INTENT: Always explain the criteria used (e.g., 'Critério: Vence em < 60 dias'). "
-        "5. AMBIGUOUS INTENT: Be objective. Do not say 'Good/Bad', show the numbers. "
-        "6. DATES: Use relative time (e.g., 'vence em 5 dias')."
-    )
-
-    # --- 1. GERADORES DE DADOS SINTÉTICOS ---
-    prefixes = ["Neo", "Alpha", "Omega", "Prime", "Global", "Vortex", "Horizon", "Blue", "Iron", "Silver", "Nexus", "Quantum", "Hyper", "Star", "Mega", "Ultra", "Dyna"]
-    suffixes = ["Tech", "Solutions", "Systems", "Corp", "Varejo", "Logistics", "Consulting", "Brasil", "Global", "Group", "Foods", "Pharma", "Soft", "Energy", "Labs"]
-    
-    def get_random_company():
-        return f"{random.choice(prefixes)}{random.choice(suffixes)}"
-
-    def get_unique_companies(n=2):
-        """Gera N empresas garantindo que não sejam iguais"""
-        comps = set()
-        while len(comps) < n:
-            comps.add(get_random_company())
-        return list(comps)
-
-    def get_random_price():
-        base = random.randint(15, 150) * 100 
-        variation = random.choice([0, 50, 90, 99])
-        return float(base + variation)
-
-    def get_date(offset_days):
-        return (datetime.now() + timedelta(days=offset_days)).strftime("%Y-%m-%d")
-
-    plans = ["Basic", "Starter", "Standard", "Pro", "Advanced", "Premium", "Gold", "Platinum", "Enterprise", "Ultimate"]
-    segments = ["Varejo", "Tecnologia", "Saúde", "Finanças", "Educação", "Indústria", "Agro", "Logística"]
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-    examples = []
+# orjson (Rust) serializa 3-5x mais rápido que o json da stdlib e já emite
+# UTF-8 sem escapar acentos; sem ele, cai no caminho stdlib equivalente.
+if orjson is not None:
+    def json_dumps(obj):
+        return orjson.dumps(obj).decode()
+
+    def json_dump_line(obj):
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+else:
+    def json_dumps(obj):
+        return json.dumps(obj, ensure_ascii=False)
+
+    def json_dump_line(obj):
+        return (json.dumps(obj, ensure_ascii=False) + '\n').encode('utf-8')
+
+# --- TEMPLATES DE RESPOSTA (compilados uma vez no import) ---
+# Os loops quentes só substituem os campos via format_map, sem re-parsear
+# o texto literal a cada exemplo.
+
+PROFILE_TMPL = """📌 Cliente: {comp}
+📊 Status: {status}
+📄 Plano: {plan}
+💰 Valor Mensal: R$ {val:,.2f}
+
+ℹ️ Observações:
+- Contrato: {data_fim}
+- Última interação há {days_last} dias"""
+
+TEMPORAL_TMPL = """Encontrei os seguintes vencimentos para o período:
+
+* {c1}: Vence em {d1} dias ({date1})
+* {c2}: Vence em {d2} dias ({date2})"""
+
+SEMANTIC_TMPL = """{phrasing}
+
+🚨 Diagnóstico:
+* Vencimento Iminente: O contrato vence em apenas {days_to_expire} dias.
+* Baixo Engajamento: Não há registro de interação há {days_silence} dias.
+
+Recomenda-se ação proativa imediata para garantir a renovação."""
+
+HISTORY_TMPL = """Histórico recente de {comp}:
 
-    # --- 2. TEMPLATES DE PERGUNTAS (VARIEDADE LINGUÍSTICA) ---
-    
-    templates_profile = [
-        "Dados da {comp}", "Quem é o cliente {comp}?", "Me fale sobre a {comp}",
-        "Qual o status da empresa {comp}?", "Ficha técnica da {comp}", 
-        "Perfil do cliente {comp}", "Resumo contratual da {comp}",
-        "A empresa {comp} está ativa?", "Mostre as informações da {comp}"
-    ]
-
-    templates_aggregated_fat = [
-        "Qual o faturamento mensal?", "Quanto a empresa fura por mês?", 
-        "Valor total dos contratos mensais", "Receita mensal atual", 
-        "Somatória das mensalidades", "Total de faturamento"
-    ]
-
-    templates_aggregated_seg = [
-        "Quantos clientes temos em {seg}?", "Número de empresas do setor {seg}",
-        "Contagem de clientes por segmento: {seg}", "Total no segmento {seg}",
-        "Distribuição de clientes em {seg}"
-    ]
-
-    templates_temporal = [
-        "Quais contratos vencem este mês?", "Lista de contratos expirando", 
-        "O que vence nos próximos dias?", "Clientes com contrato acabando",
-        "Prazos de vencimento próximos", "Renovações pendentes"
-    ]
-
-    templates_semantic_risk = [
-        "Quais clientes têm risco de churn?", "Quem está em risco de sair?", 
-        "Lista de clientes com probabilidade de cancelamento", "Alerta de churn",
-        "Clientes críticos (risco)", "Empresas com risco de evasão"
-    ]
-
-    templates_ambiguous = [
-        "O cliente {comp} é bom?", "A {comp} vale a pena?", 
-        "Como está a situação da {comp}?", "A empresa {comp} é confiável?",
-        "Qual a reputação da {comp}?", "Devo me preocupar com a {comp}?"
-    ]
-
-    # ==============================================================================
-    # 3. GERAÇÃO DE EXEMPLOS (LOOP PRINCIPAL)
-    # ==============================================================================
-
-    # --- A. PROFILE ---
+* 📞 {date1} - Suporte: Ticket aberto (há {d1} dias)
+* 🤝 {date2} - Vendas: Reunião Mensal (há {d2} dias)"""
+
+ABSENCE_TMPL = """⚠️ Alerta de Inatividade
+
+O cliente {comp} está sem nenhuma interação há {days_silence} dias.
+Recomendamos um contato de reaquecimento urgente."""
+
+AMBIGUOUS_TMPL = """Analise os indicadores objetivos da empresa {comp}:
+
+* Tempo de Casa: {tenure} anos
+* Interações (90 dias): {inters} ({obs_interacao})
+* Valor Contrato: R$ {val:,.2f}
+
+Estes dados permitem avaliar a saúde da conta com base no histórico recente."""
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_FILE = os.path.join(BASE_DIR, 'dataset_finetuning_v2.jsonl')
+
+# SYSTEM PROMPT (O mesmo de Produção)
+SYSTEM_PROMPT = (
+    "Role: ClientaTech AI Analyst. "
+    "Task: Transform raw SQL data into a professional response based on user Intent. "
+    "Rules: "
+    "1. LANGUAGE: Portuguese (pt-BR). "
+    "2. IF DATA IS EMPTY: Respond 'Não encontrei registros correspondentes.' (Except Greeting). "
+    "3. PROFILE INTENT: Use the fixed 'Rich Card' format with emojis. "
+    "4. SEMANTIC INTENT: Always explain the criteria used (e.g., 'Critério: Vence em < 60 dias'). "
+    "5. AMBIGUOUS INTENT: Be objective. Do not say 'Good/Bad', show the numbers. "
+    "6. DATES: Use relative time (e.g., 'vence em 5 dias')."
+)
+
+# --- 1. GERADORES DE DADOS SINTÉTICOS ---
+prefixes = ["Neo", "Alpha", "Omega", "Prime", "Global", "Vortex", "Horizon", "Blue", "Iron", "Silver", "Nexus", "Quantum", "Hyper", "Star", "Mega", "Ultra", "Dyna"]
+suffixes = ["Tech", "Solutions", "Systems", "Corp", "Varejo", "Logistics", "Consulting", "Brasil", "Global", "Group", "Foods", "Pharma", "Soft", "Energy", "Labs"]
+
+# Produto cartesiano completo (17 x 15 = 255 nomes), construído uma vez
+all_company_names = [p + s for p in prefixes for s in suffixes]
+
+# Pool pré-embaralhado percorrido ciclicamente: um next() no lugar de dois
+# random.choice por nome, com diversidade garantida dentro de cada ciclo
+_company_pool = all_company_names[:]
+random.shuffle(_company_pool)
+_company_iter = itertools.cycle(_company_pool)
+
+def get_random_company():
+    return next(_company_iter)
+
+def get_unique_companies(n=2):
+    """Gera N empresas distintas em uma única passada (sem rejection sampling)"""
+    return random.sample(all_company_names, n)
+
+def get_random_price():
+    base = random.randint(15, 150) * 100
+    variation = random.choice([0, 50, 90, 99])
+    return float(base + variation)
+
+# One clock read for the whole run; every generated date is relative to it
+now = datetime.now()
+
+def get_date(offset_days):
+    return (now + timedelta(days=offset_days)).date().isoformat()
+
+plans = ["Basic", "Starter", "Standard", "Pro", "Advanced", "Premium", "Gold", "Platinum", "Enterprise", "Ultimate"]
+segments = ["Varejo", "Tecnologia", "Saúde", "Finanças", "Educação", "Indústria", "Agro", "Logística"]
+
+# --- 2. TEMPLATES DE PERGUNTAS (VARIEDADE LINGUÍSTICA) ---
+
+templates_profile = [
+    "Dados da {comp}", "Quem é o cliente {comp}?", "Me fale sobre a {comp}",
+    "Qual o status da empresa {comp}?", "Ficha técnica da {comp}",
+    "Perfil do cliente {comp}", "Resumo contratual da {comp}",
+    "A empresa {comp} está ativa?", "Mostre as informações da {comp}"
+]
+
+templates_aggregated_fat = [
+    "Qual o faturamento mensal?", "Quanto a empresa fura por mês?",
+    "Valor total dos contratos mensais", "Receita mensal atual",
+    "Somatória das mensalidades", "Total de faturamento"
+]
+
+templates_aggregated_seg = [
+    ("Quantos clientes ativos em {seg}?", "ativos"),
+    ("Total de clientes em {seg}?", "registrados"),
+    ("Número de contratos em {seg}?", "na base")
+]
+
+templates_temporal = [
+    "Quais contratos vencem este mês?", "Lista de contratos expirando",
+    "O que vence nos próximos dias?", "Clientes com contrato acabando",
+    "Prazos de vencimento próximos", "Renovações pendentes"
+]
+
+templates_semantic_risk = [
+    "Quais clientes têm risco de churn?", "Quem está em risco de sair?",
+    "Lista de clientes com probabilidade de cancelamento", "Alerta de churn",
+    "Clientes críticos (risco)", "Empresas com risco de evasão"
+]
+
+semantic_phrasings = [
+    "Identifiquei indicadores críticos de retenção:",
+    "Este cliente apresenta alto risco de churn devido à combinação de fatores:",
+    "Alerta de risco gerado pelos seguintes critérios:"
+]
+
+templates_history = ["Histórico do {comp}", "Interações da {comp}", "O que houve com a {comp}?"]
+
+templates_ambiguous = [
+    "O cliente {comp} é bom?", "A {comp} vale a pena?",
+    "Como está a situação da {comp}?", "A empresa {comp} é confiável?",
+    "Qual a reputação da {comp}?", "Devo me preocupar com a {comp}?"
+]
+
+# ==============================================================================
+# 3. GERAÇÃO DE EXEMPLOS (UM GERADOR POR INTENT)
+# Cada bloco é independente (sem estado compartilhado), então cada intent é
+# uma função top-level que pode rodar em um worker de multiprocessing.
+# ==============================================================================
+
+def gen_profile(n=40):
     print("🔹 Gerando PROFILE (Com Lógica de Status Realista)...")
-    
-    for _ in range(40):
+    examples = []
+
+    # Sorteios em lote: uma chamada random.choices(k=N) por campo em vez de
+    # um random.choice por iteração
+    tpl_pick = random.choices(templates_profile, k=n)
+    plan_pick = random.choices(plans, k=n)
+
+    for template, plan in zip(tpl_pick, plan_pick):
         # 1. Escolhe empresa e pergunta dinamicamente
         comp = get_random_company()
-        template = random.choice(templates_profile)
         question = template.format(comp=comp) # Ex: "A empresa NeoTech está ativa?"
-        
+
         # 2. Gera datas variadas (incluindo passadas/vencidas)
-        days_end = random.randint(-100, 400) 
+        days_end = random.randint(-100, 400)
         days_last = random.randint(1, 90)
-        
+
         # 3. LÓGICA DE CONSISTÊNCIA (Status vs Data)
         # Se data_fim < 0, o contrato venceu. Status NÃO pode ser 'Ativo'.
         if days_end < 0:
             status = random.choice(["Inativo", "Suspenso", "Bloqueado"])
-            # Texto visual para o Analista usar na resposta
-            # obs_vencimento = f"⚠️ VENCIDO há {abs(days_end)} dias"
-        elif days_end < 30:
-            status = "Ativo"
-            # obs_vencimento = f"⚠️ Vence em {days_end} dias" # Urgência
         else:
             status = "Ativo"
-            # obs_vencimento = f"Vence em {days_end} dias" # Normal
 
-        plan = random.choice(plans)
         val = get_random_price()
 
         # 4. Monta o JSON (Simulando o retorno do SQL)
         raw_data = [{
-            "nome": comp, 
-            "status": status, 
-            "plano": plan, 
-            "valor_mensal": val, 
-            "data_fim": get_date(days_end), 
+            "nome": comp,
+            "status": status,
+            "plano": plan,
+            "valor_mensal": val,
+            "data_fim": get_date(days_end),
             "ultima_interacao": get_date(-days_last),
             "dias_para_expirar": days_end,
             "dias_desde_ultima_interacao": days_last
         }]
-        
-        # 5. O USER_MSG FINAL (Aqui está a resposta da sua pergunta)
-        # Note que usamos 'question' (variável) e não a string fixa
-        user_msg = f"Intent: PROFILE\nData: {json.dumps(raw_data, ensure_ascii=False)}\nQuery: {question}"
-        
-        # 6. RESPOSTA ESPERADA (Target do Fine-Tuning)
+
+        user_msg = f"Intent: PROFILE\nData: {json_dumps(raw_data)}\nQuery: {question}"
+
+        # RESPOSTA ESPERADA (Target do Fine-Tuning)
         # [cite_start]Segue o formato obrigatório do case [cite: 71]
-        response = f"""📌 Cliente: {comp}
-📊 Status: {status}
-📄 Plano: {plan}
-💰 Valor Mensal: R$ {val:,.2f}
+        response = PROFILE_TMPL.format_map({
+            "comp": comp, "status": status, "plan": plan, "val": val,
+            "data_fim": get_date(days_end), "days_last": days_last
+        })
 
-ℹ️ Observações:
-- Contrato: {get_date(days_end)}
-- Última interação há {days_last} dias"""
-        
         examples.append({"input": user_msg, "output": response})
+    return examples
 
-    # --- B. AGGREGATED ---
-    templates_aggregated_seg = [
-        ("Quantos clientes ativos em {seg}?", "ativos"),
-        ("Total de clientes em {seg}?", "registrados"),
-        ("Número de contratos em {seg}?", "na base")
-    ]
+def gen_aggregated(n=10):
+    examples = []
+    seg_pick = random.choices(segments, k=n)
+    tpl_pick = random.choices(templates_aggregated_seg, k=n)
 
-    for _ in range(10):
-        seg = random.choice(segments)
+    for seg, (tpl_query, termo) in zip(seg_pick, tpl_pick):
         qtd = random.randint(5, 100)
-        
-        # Escolhe um par (pergunta, termo_contexto)
-        tpl_query, termo = random.choice(templates_aggregated_seg)
         question = tpl_query.format(seg=seg)
-        
-        user_msg = f"Intent: AGGREGATED\nData: {json.dumps([{'segmento': seg, 'qtd': qtd}])}\nQuery: {question}"
-        
-        # O modelo aprende a usar o termo que faz sentido com a pergunta, 
+
+        user_msg = f"Intent: AGGREGATED\nData: {json_dumps([{'segmento': seg, 'qtd': qtd}])}\nQuery: {question}"
+
+        # O modelo aprende a usar o termo que faz sentido com a pergunta,
         # ou usa um termo genérico se o dado for apenas um número.
         response = f"O segmento {seg} possui um total de {qtd} clientes {termo}."
-        
+
         examples.append({"input": user_msg, "output": response})
+    return examples
 
-    # --- C. TEMPORAL ---
+def gen_temporal(n=10):
     print("🔹 Gerando TEMPORAL...")
-    for _ in range(10):
-        c1, c2 = get_unique_companies(2) # SOLUÇÃO PARA O SEU PROBLEMA
+    examples = []
+    for question in random.choices(templates_temporal, k=n):
+        c1, c2 = get_unique_companies(2)
         d1, d2 = random.randint(1, 15), random.randint(16, 30)
-        
+
         raw_data = [
             {"nome": c1, "data_fim": get_date(d1)},
             {"nome": c2, "data_fim": get_date(d2)}
         ]
-        question = random.choice(templates_temporal)
-        user_msg = f"Intent: TEMPORAL\nData: {json.dumps(raw_data)}\nQuery: {question}"
-        
-        response = f"""Encontrei os seguintes vencimentos para o período:
+        user_msg = f"Intent: TEMPORAL\nData: {json_dumps(raw_data)}\nQuery: {question}"
 
-* {c1}: Vence em {d1} dias ({get_date(d1)})
-* {c2}: Vence em {d2} dias ({get_date(d2)})"""
+        response = TEMPORAL_TMPL.format_map({
+            "c1": c1, "c2": c2, "d1": d1, "d2": d2,
+            "date1": get_date(d1), "date2": get_date(d2)
+        })
         examples.append({"input": user_msg, "output": response})
+    return examples
 
-    # --- D. SEMANTIC (Risco - Análise Dinâmica) ---
+def gen_semantic(n=10):
     print("🔹 Gerando SEMANTIC (Evidência, não Regra Fixa)...")
-    for _ in range(10):
+    examples = []
+    q_pick = random.choices(templates_semantic_risk, k=n)
+    phrasing_pick = random.choices(semantic_phrasings, k=n)
+
+    for question, phrasing in zip(q_pick, phrasing_pick):
         comp = get_random_company()
-        question = random.choice(templates_semantic_risk)
-        
+
         # Geramos dados que justificam o risco, mas com valores variados
         days_to_expire = random.randint(1, 59) # Qualquer valor abaixo de 60
         days_silence = random.randint(46, 120) # Qualquer valor acima de 45
-        
+
         raw_data = [{
-            "nome": comp, 
-            "data_fim": get_date(days_to_expire), 
-            "dias_para_expirar": days_to_expire, 
+            "nome": comp,
+            "data_fim": get_date(days_to_expire),
+            "dias_para_expirar": days_to_expire,
             "dias_desde_ultima_interacao": days_silence
         }]
-        
-        user_msg = f"Intent: SEMANTIC\nData: {json.dumps(raw_data)}\nQuery: {question}"
-        
-        # ESTRATÉGIA: O modelo explica o PORQUÊ com base nos números que ele VÊ, 
-        # em vez de citar uma regra estática que ele "decorou".
-        
-        # Variações de explicação para ele aprender a raciocinar
-        phrasing = random.choice([
-            "Identifiquei indicadores críticos de retenção:",
-            "Este cliente apresenta alto risco de churn devido à combinação de fatores:",
-            "Alerta de risco gerado pelos seguintes critérios:"
-        ])
 
-        response = f"""{phrasing}
+        user_msg = f"Intent: SEMANTIC\nData: {json_dumps(raw_data)}\nQuery: {question}"
 
-🚨 Diagnóstico:
-* Vencimento Iminente: O contrato vence em apenas {days_to_expire} dias.
-* Baixo Engajamento: Não há registro de interação há {days_silence} dias.
+        # ESTRATÉGIA: O modelo explica o PORQUÊ com base nos números que ele VÊ,
+        # em vez de citar uma regra estática que ele "decorou".
+        response = SEMANTIC_TMPL.format_map({
+            "phrasing": phrasing,
+            "days_to_expire": days_to_expire, "days_silence": days_silence
+        })
 
-Recomenda-se ação proativa imediata para garantir a renovação."""
-        
         examples.append({"input": user_msg, "output": response})
+    return examples
 
-    # --- F. HISTORY (New w/ dias_antes) ---
+def gen_history(n=10):
     print("🔹 Gerando HISTORY (Time Aware - PT keys)...")
-    templates_history = ["Histórico do {comp}", "Interações da {comp}", "O que houve com a {comp}?"]
-    
-    for _ in range(10):
+    examples = []
+    for template in random.choices(templates_history, k=n):
         comp = get_random_company()
-        question = random.choice(templates_history).format(comp=comp)
-        
+        question = template.format(comp=comp)
+
         # Simulate 2 interactions
         d1, d2 = random.randint(2, 5), random.randint(10, 30)
         raw_data = [
             {"data": get_date(-d1), "tipo": "Suporte", "descricao": "Ticket aberto", "dias_antes": d1},
             {"data": get_date(-d2), "tipo": "Vendas", "descricao": "Reunião Mensal", "dias_antes": d2}
         ]
-        
-        user_msg = f"Intent: HISTORY\nData: {json.dumps(raw_data)}\nQuery: {question}"
-        
-        response = f"""Histórico recente de {comp}:
-
-* 📞 {get_date(-d1)} - Suporte: Ticket aberto (há {d1} dias)
-* 🤝 {get_date(-d2)} - Vendas: Reunião Mensal (há {d2} dias)"""
-        
+
+        user_msg = f"Intent: HISTORY\nData: {json_dumps(raw_data)}\nQuery: {question}"
+
+        response = HISTORY_TMPL.format_map({
+            "comp": comp, "d1": d1, "d2": d2,
+            "date1": get_date(-d1), "date2": get_date(-d2)
+        })
+
         examples.append({"input": user_msg, "output": response})
+    return examples
 
-    # --- G. ABSENCE (New w/ dias_desde_ultima_interacao) ---
+def gen_absence(n=10):
     print("🔹 Gerando ABSENCE...")
-    for _ in range(10):
+    examples = []
+    for _ in range(n):
         comp = get_random_company()
         days_silence = random.randint(60, 200)
-        
+
         raw_data = [{"nome": comp, "dias_desde_ultima_interacao": days_silence}]
-        user_msg = f"Intent: ABSENCE\nData: {json.dumps(raw_data)}\nQuery: 'Clientes sem contato'"
-        
-        response = f"""⚠️ Alerta de Inatividade
+        user_msg = f"Intent: ABSENCE\nData: {json_dumps(raw_data)}\nQuery: 'Clientes sem contato'"
+
+        response = ABSENCE_TMPL.format_map({"comp": comp, "days_silence": days_silence})
 
-O cliente {comp} está sem nenhuma interação há {days_silence} dias. 
-Recomendamos um contato de reaquecimento urgente."""
-        
         examples.append({"input": user_msg, "output": response})
+    return examples
 
-    # --- E. AMBIGUOUS (20 exemplos) ---
-    # --- E. AMBIGUOUS (Correção: Frequência em vez de Julgamento) ---
+def gen_ambiguous(n=10):
+    # AMBIGUOUS (Correção: Frequência em vez de Julgamento)
     print("🔹 Gerando AMBIGUOUS (Neutro)...")
-    for _ in range(10):
+    examples = []
+    for template in random.choices(templates_ambiguous, k=n):
         comp = get_random_company()
-        question = random.choice(templates_ambiguous).format(comp=comp)
-        
+        question = template.format(comp=comp)
+
         tenure = random.randint(1, 5)
         inters = random.randint(0, 25) # Variar bem
         val = get_random_price()
-        
+
         raw_data = [{"nome": comp, "anos_casa": tenure, "interacoes_90d": inters, "valor": val}]
-        user_msg = f"Intent: AMBIGUOUS\nData: {json.dumps(raw_data)}\nQuery: {question}"
-        
+        user_msg = f"Intent: AMBIGUOUS\nData: {json_dumps(raw_data)}\nQuery: {question}"
+
         # LÓGICA CORRETA: Transformar o número em frequência observável, sem adjetivar.
         if inters == 0:
             obs_interacao = "Nenhuma interação registrada no período"
@@ -290,43 +354,61 @@ Recomendamos um contato de reaquecimento urgente."""
             obs_interacao = "Média de 1 interação/mês"
         else:
             # Arredondamento simples para dar noção de volume
-            media = round(inters / 3, 1) 
+            media = round(inters / 3, 1)
             obs_interacao = f"Média aprox. de {media} interações/mês"
-        
-        # O modelo apresenta a MÉDIA (Fato Matemático), não a OPINIÃO "Bom/Ruim".
-        response = f"""Analise os indicadores objetivos da empresa {comp}:
 
-* Tempo de Casa: {tenure} anos
-* Interações (90 dias): {inters} ({obs_interacao})
-* Valor Contrato: R$ {val:,.2f}
+        # O modelo apresenta a MÉDIA (Fato Matemático), não a OPINIÃO "Bom/Ruim".
+        response = AMBIGUOUS_TMPL.format_map({
+            "comp": comp, "tenure": tenure, "inters": inters,
+            "obs_interacao": obs_interacao, "val": val
+        })
 
-Estes dados permitem avaliar a saúde da conta com base no histórico recente."""
-        
         examples.append({"input": user_msg, "output": response})
+    return examples
+
+# (intent, quantidade) — os blocos são independentes, então rodam em paralelo
+GENERATION_TASKS = [
+    (gen_profile, 40),
+    (gen_aggregated, 10),
+    (gen_temporal, 10),
+    (gen_semantic, 10),
+    (gen_history, 10),
+    (gen_absence, 10),
+    (gen_ambiguous, 10),
+]
 
-    # --- F. GREETING & EMPTY (Fixos) ---
-    # ... (Manter código anterior para greetings e empty cases) ...
+def generate_robust_finetuning():
+    examples = []
+
+    # Um worker por intent; initializer=random.seed garante que cada processo
+    # filho re-semeia o PRNG em vez de herdar o estado do pai via fork.
+    with ProcessPoolExecutor(initializer=random.seed) as pool:
+        futures = [pool.submit(fn, n) for fn, n in GENERATION_TASKS]
+        for future in futures:
+            examples.extend(future.result())
 
     # SAVE
     random.shuffle(examples) # Importante embaralhar!
     print(f"\n🔄 Salvando {len(examples)} exemplos variados...")
-    
-    with open(output_file, 'w', encoding='utf-8') as f:
-        for ex in examples:
-            json_line = {
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": ex['input']},
-                    {"role": "assistant", "content": ex['output']}
-                ]
-            }
-            f.write(json.dumps(json_line, ensure_ascii=False) + '\n')
-            
-    print(f"✅ Dataset gerado em: {output_file}")
+
+    lines = []
+    for ex in examples:
+        json_line = {
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": ex['input']},
+                {"role": "assistant", "content": ex['output']}
+            ]
+        }
+        lines.append(json_dump_line(json_line))
+
+    # Pre-encoded bytes + writelines on a binary file: no per-line
+    # encode/write round trip through the text layer. The 1 MB buffer means
+    # the whole dataset goes to disk in essentially one flush at close.
+    with open(OUTPUT_FILE, 'wb', buffering=1024 * 1024) as f:
+        f.writelines(lines)
+
+    print(f"✅ Dataset gerado em: {OUTPUT_FILE}")
 
 if __name__ == "__main__":
     generate_robust_finetuning()
-        
-        
-        
-  
\ No newline at end of file
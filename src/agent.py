@@ -2,18 +2,46 @@ import os
 import sys
 import re
 import json
+import random
 import sqlite3
 import logging
-import hashlib
+import logging.handlers
+import asyncio
+import queue
+import struct
+import threading
+import atexit
+import concurrent.futures
+import functools
+import itertools
+import time
 from datetime import datetime
-from dotenv import load_dotenv
 from ollama import Client
 
+try:
+	import orjson
+except ImportError:
+	orjson = None
+
+# orjson serializa/parseia 3-10x mais rápido que o json da stdlib e emite
+# UTF-8 direto; sem ele, os helpers caem no caminho stdlib equivalente.
+if orjson is not None:
+	def _json_dumps(obj):
+		return orjson.dumps(obj).decode()
+	def _json_dumps_sorted(obj):
+		# Chaves ordenadas: serialização bit-exata do mesmo dict entre chamadas
+		# (prefixos estáveis ajudam o KV cache do Ollama)
+		return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS).decode()
+	_json_loads = orjson.loads
+else:
+	def _json_dumps(obj):
+		return json.dumps(obj, ensure_ascii=False)
+	def _json_dumps_sorted(obj):
+		return json.dumps(obj, ensure_ascii=False, sort_keys=True)
+	_json_loads = json.loads
 
-# --- CONFIGURATION & SETUP ---
 
-# Load environment variables
-load_dotenv()
+# --- CONFIGURATION & SETUP ---
 
 # Constants
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -22,9 +50,27 @@ CACHE_DB_PATH = os.path.join(BASE_DIR, 'data', 'cache.db')
 LOG_PATH = os.path.join(BASE_DIR, 'logs', 'agent.log')
 FT_PATH = os.path.join(BASE_DIR, 'finetuning', 'dataset_finetuning_v2.jsonl')
 
+# Load environment variables — import do dotenv só quando existe um .env para
+# ler (o parse do pacote custa dezenas de ms no startup do REPL)
+if os.path.exists(os.path.join(BASE_DIR, '.env')):
+	from dotenv import load_dotenv
+	load_dotenv()
+
 # Models
-MODEL_NAME = "qwen2.5-coder:14b"          # Logic & SQL
-MODEL_NAME_FT = "llama3-finetuned:latest" # Analyst Persona
+# Quantização por tarefa: classificar/gerar SQL tolera Q4_K_M (decode ~2x mais
+# rápido — a fase de token é limitada por banda de memória); o Analista, que
+# fala com o usuário, fica na precisão padrão.
+MODEL_NAME = "qwen2.5-coder:14b"                         # Analyst / default
+MODEL_NAME_LOGIC = "qwen2.5-coder:14b-instruct-q4_K_M"   # SQL generation
+MODEL_NAME_INTENT = "qwen2.5-coder:7b-instruct-q4_K_M"   # Intent (6 classes; 7B basta)
+MODEL_NAME_FT = "llama3-finetuned:latest"                # Analyst Persona
+EMBED_MODEL_NAME = "nomic-embed-text"                    # Semantic cache
+
+# Similaridade mínima para um hit semântico no cache
+SEMANTIC_CACHE_THRESHOLD = 0.92
+
+# Mantém os modelos residentes no Ollama entre perguntas (sem reload)
+KEEP_ALIVE = "24h"
 
 # Initialize Clients
 client = Client()
@@ -36,11 +82,18 @@ class StructuredLogger:
 		self.logger = logging.getLogger("ClientaTechAgent")
 		self.logger.setLevel(logging.INFO)
 		
-		# File Handler (JSON Lines)
+		# File Handler (JSON Lines) atrás de uma fila: logger.log() vira um
+		# queue.put não-bloqueante e o QueueListener faz a serialização final e
+		# o write em uma thread de fundo — zero I/O de log no caminho da
+		# requisição. O stop no atexit drena a fila antes de sair.
 		file_handler = logging.FileHandler(log_path)
 		file_handler.setFormatter(logging.Formatter('%(message)s'))
-		self.logger.addHandler(file_handler)
-		
+		log_queue = queue.Queue(-1)
+		self.logger.addHandler(logging.handlers.QueueHandler(log_queue))
+		self._listener = logging.handlers.QueueListener(log_queue, file_handler)
+		self._listener.start()
+		atexit.register(self._listener.stop)
+
 		# Stream Handler (Optional - minimal output to console if needed, keeping it off for now to not clutter stdout)
 		# stream_handler = logging.StreamHandler(sys.stdout)
 		# self.logger.addHandler(stream_handler)
@@ -52,21 +105,50 @@ class StructuredLogger:
 			"event": event_type,
 			**kwargs
 		}
-		self.logger.info(json.dumps(entry, ensure_ascii=False))
+		self.logger.info(_json_dumps(entry))
 
 logger = StructuredLogger(LOG_PATH)
 
 
+# --- MODEL WARMUP ---
+
+def warmup_models():
+	"""
+	Pré-carrega os modelos no Ollama para a primeira pergunta não pagar o
+	cold-start (o load de um 14B leva dezenas de segundos).
+	"""
+	for model in dict.fromkeys((MODEL_NAME_INTENT, MODEL_NAME_LOGIC, MODEL_NAME, MODEL_NAME_FT)):
+		try:
+			client.chat(
+				model=model,
+				messages=[{"role": "user", "content": "ok"}],
+				options={"num_predict": 1},
+				keep_alive=KEEP_ALIVE
+			)
+			logger.log("model_warmup", model=model, status="success")
+		except Exception as e:
+			logger.log("model_warmup", model=model, status="error", error=str(e))
+	# Centroides do classificador leve (usa o modelo de embedding já residente)
+	_build_intent_centroids()
+
+
 # --- LLM WITH METRICS ---
 
-def call_llm(model, messages, options=None, component="unknown"):
+# Options dimensionadas por componente: num_ctx no tamanho do workload (KV
+# cache menor = prefill mais rápido e mais espaço para chamadas concorrentes)
+# e num_predict como teto contra decode descontrolado.
+_OPTS_INTENT = {"temperature": 0.0, "num_ctx": 1024, "num_predict": 80}
+_OPTS_SQL = {"temperature": 0.1, "num_ctx": 2048, "num_predict": 384}
+_OPTS_COMBINED = {"temperature": 0.0, "num_ctx": 2048, "num_predict": 384}
+_OPTS_ANALYST = {"temperature": 0.4, "num_ctx": 4096, "num_predict": 768}
+
+def call_llm(model, messages, options=None, component="unknown", format=None):
 	"""Wraps Ollama chat with metrics logging."""
-	start_time = datetime.now()
+	t0 = time.perf_counter_ns()
 	try:
-		# Call the model
-		response = client.chat(model=model, messages=messages, options=options)
-		end_time = datetime.now()
-		duration_ms = (end_time - start_time).total_seconds() * 1000
+		# Call the model (keep_alive evita o unload/reload entre chamadas)
+		response = client.chat(model=model, messages=messages, options=options, keep_alive=KEEP_ALIVE, format=format)
+		duration_ms = (time.perf_counter_ns() - t0) / 1_000_000
 		
 		# Extract metrics (Ollama specific)
 		prompt_tokens = response.get('prompt_eval_count', 0)
@@ -83,8 +165,43 @@ def call_llm(model, messages, options=None, component="unknown"):
 		)
 		return response
 	except Exception as e:
-		end_time = datetime.now()
-		duration_ms = (end_time - start_time).total_seconds() * 1000
+		duration_ms = (time.perf_counter_ns() - t0) / 1_000_000
+		logger.log(
+			event_type="llm_call",
+			component=component,
+			model=model,
+			duration_ms=round(duration_ms, 2),
+			status="error",
+			error=str(e)
+		)
+		raise e
+
+def call_llm_stream(model, messages, options=None, component="unknown"):
+	"""
+	Variante streaming de call_llm: entrega os pedaços de texto conforme chegam.
+	O decode é sequencial e domina a latência — streaming não muda o tempo
+	total, mas derruba o time-to-first-token percebido. Métricas são logadas
+	ao final (o último chunk do Ollama traz os contadores).
+	"""
+	t0 = time.perf_counter_ns()
+	try:
+		prompt_tokens = eval_tokens = 0
+		for chunk in client.chat(model=model, messages=messages, options=options, keep_alive=KEEP_ALIVE, stream=True):
+			prompt_tokens = chunk.get('prompt_eval_count', prompt_tokens)
+			eval_tokens = chunk.get('eval_count', eval_tokens)
+			yield chunk['message']['content']
+		duration_ms = (time.perf_counter_ns() - t0) / 1_000_000
+		logger.log(
+			event_type="llm_call",
+			component=component,
+			model=model,
+			duration_ms=round(duration_ms, 2),
+			tokens_in=prompt_tokens,
+			tokens_out=eval_tokens,
+			status="success"
+		)
+	except Exception as e:
+		duration_ms = (time.perf_counter_ns() - t0) / 1_000_000
 		logger.log(
 			event_type="llm_call",
 			component=component,
@@ -98,22 +215,51 @@ def call_llm(model, messages, options=None, component="unknown"):
 
 # --- INFRASTRUCTURE (DB & CACHE) ---
 
-def get_db_connection():
-	"""Conecta ao banco de dados de negócio (SQLite)."""
-	conn = sqlite3.connect(DB_PATH)
+# Conexões persistentes: connect + parse por chamada dominava o custo das
+# consultas, não a execução em si. check_same_thread=False porque o Streamlit
+# atende callbacks em threads diferentes.
+_DB_CONN = None
+_CACHE_CONN = None
+
+# SQL do cache como constantes: o mesmo texto reaproveita o prepared
+# statement interno do sqlite3
+_SQL_GET_CACHE = "SELECT sql_generated, intent FROM llm_cache WHERE norm_query = ?"
+_SQL_SAVE_CACHE = "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?)"
+_SQL_SCAN_EMBEDDINGS = "SELECT sql_generated, intent, embedding FROM llm_cache WHERE embedding IS NOT NULL"
+
+def _open_connection(path):
+	# cached_statements maior: o SQL arbitrário gerado pelo LLM não deve
+	# despejar os statements fixos do cache (get/save/scan) do cache interno
+	conn = sqlite3.connect(path, check_same_thread=False, cached_statements=256)
 	conn.row_factory = sqlite3.Row
+	conn.execute('PRAGMA journal_mode=WAL')
+	conn.execute('PRAGMA synchronous=NORMAL')
+	# Leituras viram hits no page cache do SO via mmap; temp/cache em memória
+	conn.execute('PRAGMA mmap_size=268435456')  # 256 MB
+	conn.execute('PRAGMA temp_store=MEMORY')
+	conn.execute('PRAGMA cache_size=-65536')    # 64 MB
 	return conn
 
+def get_db_connection():
+	"""Conexão (persistente) com o banco de dados de negócio (SQLite)."""
+	global _DB_CONN
+	if _DB_CONN is None:
+		_DB_CONN = _open_connection(DB_PATH)
+	return _DB_CONN
+
 def get_cache_connection():
-	"""Conecta ao banco separado de Cache."""
-	conn = sqlite3.connect(CACHE_DB_PATH)
-	conn.row_factory = sqlite3.Row
-	return conn
+	"""Conexão (persistente) com o banco separado de Cache."""
+	global _CACHE_CONN
+	if _CACHE_CONN is None:
+		_CACHE_CONN = _open_connection(CACHE_DB_PATH)
+	return _CACHE_CONN
 
+@functools.lru_cache(maxsize=1)
 def get_schema():
 	"""
-	Recupera o schema do banco de dados dinamicamente. 
+	Recupera o schema do banco de dados dinamicamente.
 	Isso é injetado no prompt para que a LLM saiba quais tabelas e colunas existem.
+	Memoizado: o schema só muda em migração, então os três PRAGMAs rodam uma vez.
 	"""
 	schema = ""
 	conn = get_db_connection()
@@ -124,58 +270,333 @@ def get_schema():
 		cursor.execute(f"PRAGMA table_info({table})")
 		columns = [f"{row['name']} ({row['type']})" for row in cursor.fetchall()]
 		schema += f"Table {table}: {', '.join(columns)}\n"
-	
-	conn.close()
+
 	return schema
 
-def init_cache():
-	"""Cria a tabela de cache se não existir."""
+def init_db():
+	"""Prepara os dois bancos: tabela/índices do cache e índices do banco de negócio."""
 	conn = get_cache_connection()
-	conn.execute('''
-		CREATE TABLE IF NOT EXISTS llm_cache (
-			query_hash TEXT PRIMARY KEY,
+	# PK = pergunta normalizada, WITHOUT ROWID: com a PK textual, a tabela
+	# clássica mantém DOIS B-trees (rowid + índice da PK) e cada lookup desce
+	# pelos dois. Sem rowid, a PK É a tabela — uma descida, metade do I/O por
+	# get_cache.
+	_CACHE_DDL = '''
+		CREATE TABLE llm_cache (
+			norm_query TEXT PRIMARY KEY,
 			user_query TEXT,
 			sql_generated TEXT,
-			intent TEXT
-		)
-	''')
+			intent TEXT,
+			embedding BLOB
+		) WITHOUT ROWID
+	'''
+	existing = conn.execute(
+		"SELECT sql FROM sqlite_master WHERE type='table' AND name='llm_cache'"
+	).fetchone()
+	if existing is None:
+		conn.execute(_CACHE_DDL)
+	elif 'norm_query' not in existing['sql']:
+		# Migração: esquemas antigos usavam hash (MD5/xxh3) como PK, com ou sem
+		# rowid, e os mais antigos nem tinham a coluna de embedding. A chave
+		# nova é recomputável a partir do user_query gravado — reconstrói a
+		# tabela uma única vez preservando as entradas.
+		try:
+			conn.execute('ALTER TABLE llm_cache ADD COLUMN embedding BLOB')
+		except sqlite3.OperationalError:
+			pass
+		conn.executescript(f'''
+			ALTER TABLE llm_cache RENAME TO llm_cache_hashed;
+			{_CACHE_DDL};
+			INSERT OR IGNORE INTO llm_cache
+				SELECT lower(trim(user_query)), user_query, sql_generated, intent, embedding
+				FROM llm_cache_hashed;
+			DROP TABLE llm_cache_hashed;
+		''')
+	# O índice extra virou puro desperdício: a PK já é o único B-tree
+	conn.execute('DROP INDEX IF EXISTS idx_query_hash')
 	conn.commit()
-	conn.close()
 
-def get_cache(user_query):
-	"""Verifica se a query já existe no cache."""
-	query_hash = hashlib.md5(user_query.lower().strip().encode()).hexdigest()
-	conn = get_cache_connection()
-	row = conn.execute("SELECT sql_generated, intent FROM llm_cache WHERE query_hash = ?", (query_hash,)).fetchone()
-	conn.close()
-	return row if row else None
-
-def save_cache(user_query, sql, intent):
-	"""Salva um SQL válido no cache."""
-	# Don't cache errors
-	if "Error" in sql or "SELECT 'Error" in sql: 
-		return 
-		
-	query_hash = hashlib.md5(user_query.lower().strip().encode()).hexdigest()
-	conn = get_cache_connection()
+	# Índices do banco de negócio, idempotentes para bancos gerados antes do
+	# setup_database atual: joins por id_cliente e ordenação por data deixam de
+	# ser full scans. ANALYZE alimenta o planner com as estatísticas.
+	db = get_db_connection()
+	db.executescript('''
+		CREATE INDEX IF NOT EXISTS idx_contratos_id_cliente ON contratos(id_cliente);
+		CREATE INDEX IF NOT EXISTS idx_interacoes_id_cliente_data ON interacoes(id_cliente, data DESC);
+		CREATE INDEX IF NOT EXISTS idx_clientes_nome_lower ON clientes(LOWER(nome));
+		ANALYZE;
+	''')
+
+# Nome antigo mantido para compatibilidade (app_ui e scripts externos)
+init_cache = init_db
+
+def _norm_query(user_query):
+	"""
+	Chave do cache: a própria pergunta normalizada. As perguntas são curtas
+	(<200 chars), então hashear + hex-encodar era puro overhead — a comparação
+	de B-tree do SQLite sobre a string é tão rápida quanto, e a chave vira
+	legível no banco de quebra.
+	"""
+	return user_query.lower().strip()
+
+def _embed(text):
+	"""Embedding da pergunta via Ollama. Retorna None se o modelo não estiver disponível."""
 	try:
-		conn.execute("INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?)", 
-					(query_hash, user_query.strip(), sql, intent))
-		conn.commit()
-		logger.log("cache_update", action="save", intent=intent)
+		result = client.embeddings(model=EMBED_MODEL_NAME, prompt=text)
+		return result['embedding']
 	except Exception as e:
-		logger.log("cache_error", error=str(e))
-	conn.close()
+		logger.log("embedding_error", error=str(e))
+		return None
+
+def _pack_embedding(vector):
+	"""
+	Quantização escalar para int8 + escala: 1/4 da memória do float32 por
+	vetor armazenado. O cosseno é invariante à escala, então a similaridade
+	opera nos inteiros diretamente; a escala fica gravada nos 4 primeiros
+	bytes para eventual dequantização.
+	"""
+	scale = (max(abs(x) for x in vector) / 127.0) or 1.0
+	quantized = [min(127, max(-127, round(x / scale))) for x in vector]
+	return struct.pack(f'<f{len(quantized)}b', scale, *quantized)
+
+def _unpack_embedding(blob):
+	# Pula a escala: para cosseno, os int8 entram direto no produto escalar
+	return struct.unpack_from(f'<{len(blob) - 4}b', blob, 4)
+
+# Índice vetorial em memória: vetores decodificados e normas pré-computadas,
+# carregados do banco uma vez. Sem ele, cada miss exato pagava o unpack dos
+# BLOBs e duas normas por candidato; com ele, o scan vira só produto escalar.
+# (Um índice aproximado tipo HNSW daria O(log N), mas para o volume de cache
+# deste agente o scan linear em memória já é desprezível frente ao LLM.)
+_EMBED_INDEX = None
+
+def _embedding_index():
+	global _EMBED_INDEX
+	if _EMBED_INDEX is None:
+		_EMBED_INDEX = []
+		for row in get_cache_connection().execute(_SQL_SCAN_EMBEDDINGS):
+			vector = _unpack_embedding(row['embedding'])
+			norm = sum(x * x for x in vector) ** 0.5
+			if norm > 0:
+				_EMBED_INDEX.append((vector, norm, row['sql_generated'], row['intent']))
+	return _EMBED_INDEX
+
+@functools.lru_cache(maxsize=512)
+def _cache_lookup(query_hash):
+	"""
+	Camada L1 em memória na frente do lookup SQLite: a mesma pergunta repetida
+	na sessão vira um dict lookup (~ns) em vez de execute+fetchone (~ms).
+	Retorna (sql, intent) ou None; invalidação acontece no flush de escrita.
+	"""
+	row = get_cache_connection().execute(_SQL_GET_CACHE, (query_hash,)).fetchone()
+	return (row['sql_generated'], row['intent']) if row else None
+
+# Pool para calcular o embedding em paralelo com o resto do pipeline: o
+# roteador dispara o cálculo antes do lookup e só bloqueia no resultado se o
+# match exato falhar — a latência do embedding fica escondida atrás do RTT.
+_EMBED_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="embed")
+
+def get_cache(user_query, embed_future=None):
+	"""Verifica se a query já existe no cache (match exato e depois semântico)."""
+	key = _norm_query(user_query)
+	# Saves pendentes primeiro: uma entrada recém-gravada precisa ser visível
+	# antes do flush em lote chegar ao SQLite
+	pending = _pending_saves.get(key)
+	if pending:
+		return {"sql_generated": pending[2], "intent": pending[3]}
+	hit = _cache_lookup(key)
+	if hit:
+		return {"sql_generated": hit[0], "intent": hit[1]}
+
+	# Fallback semântico: "Clientes em risco?" e "Quem está em risco?" devem
+	# acertar a mesma entrada mesmo sem hash idêntico. O scan roda sobre o
+	# índice em memória — ordens de grandeza mais barato que uma chamada ao LLM.
+	query_vector = embed_future.result() if embed_future is not None else _embed(user_query)
+	if query_vector is None:
+		return None
+	query_norm = sum(x * x for x in query_vector) ** 0.5
+	if query_norm == 0:
+		return None
+
+	best_hit, best_sim = None, 0.0
+	for vector, norm, sql, intent in _embedding_index():
+		dot = sum(x * y for x, y in zip(query_vector, vector))
+		sim = dot / (query_norm * norm)
+		if sim > best_sim:
+			best_hit, best_sim = (sql, intent), sim
+
+	if best_sim >= SEMANTIC_CACHE_THRESHOLD:
+		logger.log("cache_hit_semantic", similarity=round(best_sim, 4), intent=best_hit[1])
+		return {"sql_generated": best_hit[0], "intent": best_hit[1]}
+	return None
+
+# Writes do cache em lote: um fsync a cada _SAVE_BATCH linhas em vez de um por
+# save (com WAL, o commit é o único ponto caro). atexit garante o flush final.
+# Dict chaveado pela query normalizada (e não lista): get_cache enxerga os
+# saves ainda não flushados (read-your-writes dentro da sessão) e re-salvar a
+# mesma pergunta substitui a entrada pendente em vez de duplicá-la.
+_pending_saves = {}
+_SAVE_BATCH = 32
+# process_queries roda pipelines inteiros em threads: append e flush do buffer
+# precisam de exclusão mútua, senão um save entre o executemany e o clear se
+# perde em silêncio (e duas threads podem cruzar o limiar e flushar juntas)
+_SAVE_LOCK = threading.Lock()
+
+def _flush_cache():
+	"""Descarrega os saves pendentes em um executemany + um commit."""
+	with _SAVE_LOCK:
+		if not _pending_saves:
+			return
+		conn = get_cache_connection()
+		try:
+			conn.executemany(_SQL_SAVE_CACHE, list(_pending_saves.values()))
+			conn.commit()
+			# O conteúdo do banco mudou: derruba a camada L1 e o índice vetorial
+			# (escritas são raras frente às leituras; o rebuild é lazy)
+			_cache_lookup.cache_clear()
+			global _EMBED_INDEX
+			_EMBED_INDEX = None
+			logger.log("cache_update", action="flush", rows=len(_pending_saves))
+			_pending_saves.clear()
+		except Exception as e:
+			logger.log("cache_error", error=str(e))
+
+atexit.register(_flush_cache)
+
+def save_cache(user_query, sql, intent, query_vector=None):
+	"""Enfileira um SQL válido para o cache (gravação em lote)."""
+	# Falhas de geração agora viram SQLGenerationError antes de chegar aqui;
+	# só resta o guard contra SQL vazio
+	if not sql:
+		return
+
+	vector = query_vector if query_vector is not None else _embed(user_query)
+	embedding = _pack_embedding(vector) if vector else None
+	key = _norm_query(user_query)
+	with _SAVE_LOCK:
+		_pending_saves[key] = (key, user_query.strip(), sql, intent, embedding)
+		need_flush = len(_pending_saves) >= _SAVE_BATCH
+	logger.log("cache_update", action="save", intent=intent)
+	if need_flush:
+		_flush_cache()
 
 
 # --- CORE LOGIC: INTENT & GENERATORS ---
 
-def classify_intent(user_query):
-	"""
-	Decides the intent of the user query. Returns: 'PROFILE', 'HISTORY', 'RISK', 'ABSENCE', 'GENERAL', 'GREETING'
-	Saída esperada: Um JSON com a categoria e o raciocínio.
-	"""
-	system_prompt = """# ROLE
+class SQLGenerationError(Exception):
+	"""Geração de SQL falhou (LLM indisponível ou output reprovado na validação)."""
+
+# Fences de markdown compilados uma vez no import, em vez de re.search com
+# literal a cada geração de SQL/classificação
+_SQL_FENCE = re.compile(r"```sql\s*(.*?)\s*```", re.DOTALL | re.IGNORECASE)
+_ANY_FENCE = re.compile(r"```\s*(.*?)\s*```", re.DOTALL)
+_JSON_FENCE = re.compile(r"```json\s*(.*?)\s*```", re.DOTALL)
+
+# Pré-validação de segurança: o agente só executa leitura. Um regex compilado
+# custa ~µs, contra pagar o parse/erro do SQLite (ou pior, executar um DROP).
+_DESTRUCTIVE_SQL = re.compile(r"\b(INSERT|UPDATE|DELETE|DROP|ALTER|ATTACH|PRAGMA|VACUUM)\b", re.IGNORECASE)
+# Prefixo de leitura via regex ancorado: examina só o começo da string, sem o
+# .upper() que copiava o SQL inteiro apenas para olhar os 6 primeiros chars
+_READ_ONLY_PREFIX = re.compile(r"\s*(?:SELECT|WITH)\b", re.IGNORECASE)
+
+def _is_safe_select(sql):
+	"""True se o SQL começa como leitura (SELECT/WITH) e não contém verbos destrutivos."""
+	if _READ_ONLY_PREFIX.match(sql) is None:
+		return False
+	return _DESTRUCTIVE_SQL.search(sql) is None
+
+_VALID_INTENTS = ('PROFILE', 'HISTORY', 'RISK', 'ABSENCE', 'GENERAL', 'GREETING')
+# Frozenset para os testes de pertinência do hot path (a tupla preserva a
+# ordem estável usada no enum da gramática)
+_VALID_INTENTS_SET = frozenset(_VALID_INTENTS)
+# Resgate de rótulo em um único scan: alternação compilada sobre a resposta
+# crua (um passe linear, em vez de N buscas independentes por intenção)
+_INTENT_FALLBACK = re.compile(r"\b(" + "|".join(_VALID_INTENTS) + r")\b")
+
+# Gramática JSON-schema para o classificador: o Ollama restringe o decode a um
+# objeto válido com category dentro do enum
+_INTENT_FORMAT = {
+	"type": "object",
+	"properties": {
+		"category": {"type": "string", "enum": list(_VALID_INTENTS)},
+		"reasoning": {"type": "string"}
+	},
+	"required": ["category"]
+}
+
+# Prefiltro por regras: antes de qualquer embedding ou LLM, padrões óbvios
+# resolvem localmente em ~µs. Os regexes são deliberadamente conservadores
+# (saudação exige match da frase inteira) e uma pergunta que case com mais de
+# uma categoria é tratada como ambígua — segue para centroide/LLM.
+_RULE_PATTERNS = (
+	("GREETING", re.compile(r"^\s*(oi|ol[aá]|hello|hi|hey|bom dia|boa tarde|boa noite|ajuda|help|o que voc[eê] faz|quem [eé] voc[eê])[\s!?.]*$", re.IGNORECASE)),
+	("RISK", re.compile(r"\b(risco|churn|insatisfeit\w*)\b", re.IGNORECASE)),
+	("ABSENCE", re.compile(r"\b(sem\s+(intera[cç]\w*|contato)|sumiu|sumiram|ausente?s?)\b", re.IGNORECASE)),
+)
+
+def _fast_classify(user_query):
+	"""Classificação por regras para os casos óbvios. Retorna a intenção ou None."""
+	matched = [intent for intent, pattern in _RULE_PATTERNS if pattern.search(user_query)]
+	if len(matched) != 1:
+		return None
+	logger.log("intent_route", intent=matched[0], query=user_query, mode="rule")
+	return matched[0]
+
+# Classificador leve por centroides: embedar a pergunta e comparar com a média
+# dos embeddings de frases-semente por intenção custa ~ms, contra segundos de
+# um LLM para devolver um de seis rótulos. O LLM vira fallback para os casos
+# ambíguos (margem entre top-1 e top-2 abaixo de _INTENT_MARGIN).
+_INTENT_SEEDS = {
+	"PROFILE": ["Me fale sobre a TechSolutions", "Dados da MegaVarejo", "Status da SaudeMais", "Perfil do cliente FinanceOne"],
+	"HISTORY": ["Interações da TechSolutions", "Histórico da MegaVarejo", "O que aconteceu com a SaudeMais?", "Últimos contatos da EducaNet"],
+	"RISK": ["Quais clientes estão em risco de churn?", "Clientes insatisfeitos", "Quais são os piores clientes?", "Risco financeiro da carteira"],
+	"ABSENCE": ["Clientes sem interação há 30 dias", "Quem sumiu?", "Quais clientes estão ausentes?", "Clientes sem contato recente"],
+	"GENERAL": ["Quais contratos vencem este mês?", "Qual o faturamento total?", "Total de clientes ativos", "Valor do contrato da TechSolutions"],
+	"GREETING": ["Oi", "Olá, tudo bem?", "O que você faz?", "Ajuda"],
+}
+_INTENT_MARGIN = 0.1
+_intent_centroids = None
+
+def _build_intent_centroids():
+	"""Embeda as sementes e guarda (centroide, norma) por intenção. Chamado no warmup."""
+	global _intent_centroids
+	centroids = {}
+	for intent, seeds in _INTENT_SEEDS.items():
+		vectors = [v for v in (_embed(seed) for seed in seeds) if v]
+		if not vectors:
+			# Modelo de embedding indisponível: classify_intent segue 100% no LLM
+			logger.log("centroid_build", status="unavailable", intent=intent)
+			return
+		dim = len(vectors[0])
+		mean = [sum(v[i] for v in vectors) / len(vectors) for i in range(dim)]
+		norm = sum(x * x for x in mean) ** 0.5
+		centroids[intent] = (mean, norm)
+	_intent_centroids = centroids
+	logger.log("centroid_build", status="success", intents=len(centroids))
+
+def _classify_by_centroid(user_query):
+	"""Retorna a intenção por similaridade de centroide, ou None se ambíguo/indisponível."""
+	if _intent_centroids is None:
+		return None
+	vector = _embed(user_query)
+	if not vector:
+		return None
+	qnorm = sum(x * x for x in vector) ** 0.5
+	if qnorm == 0:
+		return None
+	scores = []
+	for intent, (centroid, cnorm) in _intent_centroids.items():
+		dot = sum(x * y for x, y in zip(vector, centroid))
+		scores.append((dot / (qnorm * cnorm), intent))
+	scores.sort(reverse=True)
+	best_sim, best_intent = scores[0]
+	if best_sim - scores[1][0] < _INTENT_MARGIN:
+		return None  # ambíguo: deixa o LLM decidir
+	logger.log("intent_route", intent=best_intent, query=user_query, mode="centroid", similarity=round(best_sim, 4))
+	return best_intent
+
+# Prompt do classificador como constante de módulo, como os dos geradores:
+# nenhum conteúdo variável, nenhuma remontagem por chamada
+_CLASSIFIER_SYSTEM_PROMPT = """# ROLE
 	Classification Expert for ClientaTech.
 
 	# GOAL
@@ -197,105 +618,113 @@ def classify_intent(user_query):
 		"reasoning": "Brief explanation of why"
 	}
 	"""
-	
+
+def classify_intent(user_query):
+	"""
+	Decides the intent of the user query. Returns: 'PROFILE', 'HISTORY', 'RISK', 'ABSENCE', 'GENERAL', 'GREETING'
+	Escada de custo: regras (~µs) -> centroide de embeddings (~ms) -> LLM
+	(segundos), cada degrau só para o que o anterior não resolve com segurança.
+	"""
+	intent = _fast_classify(user_query)
+	if intent is not None:
+		return intent
+	intent = _classify_by_centroid(user_query)
+	if intent is not None:
+		return intent
 	try:
 		response = call_llm(
-			model=MODEL_NAME,
+			model=MODEL_NAME_INTENT,
 			messages=[
-				{"role": "system", "content": system_prompt},
+				{"role": "system", "content": _CLASSIFIER_SYSTEM_PROMPT},
 				{"role": "user", "content": user_query}
 			],
-			options={"temperature": 0.0}, # Deterministic
-			component="intent_classifier"
+			options=_OPTS_INTENT, # Deterministic
+			component="intent_classifier",
+			format=_INTENT_FORMAT
 		)
 		content = response['message']['content'].strip()
-		
-		# Try to parse JSON
-		try:
-			 # Handle markdown code blocks if model encapsulates JSON
-			if "```json" in content:
-				import re
-				match = re.search(r"```json\s*(.*?)\s*```", content, re.DOTALL)
-				if match: content = match.group(1)
-				 
-			data = json.loads(content)
-			intent = data.get("category", "GREETING").strip().upper()
-			reasoning = data.get("reasoning", "No reasoning provided")
-			print(f"🤔 Raciocínio (DEBUG): {reasoning}")
-			 
-		except json.JSONDecodeError:
-			 # Fallback if model fails strictly JSON
-			logger.log("intent_error", error="JSON Parse Error", content=content)
-			intent = "GREETING" 
-
-		# Validation/Fallback
-		valid_intents = ['PROFILE', 'HISTORY', 'RISK', 'ABSENCE', 'GENERAL', 'GREETING']
-		intent_clean = intent.upper().strip()
-
-		if intent_clean in valid_intents:
-			intent = intent_clean
-		else:
-			# Heurística Dinâmica
-			found_intent = None
-			for valid_item in valid_intents:
-				if valid_item in intent_clean:
-					found_intent = valid_item
-					break 
-			
-			intent = found_intent if found_intent else "GREETING"
-		
+
+		# Decodificação restrita à gramática (format=): sem fences de markdown,
+		# sem prosa, sem heurística de recuperação — só o JSON pedido.
+		data = _json_loads(content)
+		intent = data.get("category", "GREETING").strip().upper()
+		reasoning = data.get("reasoning", "No reasoning provided")
+		print(f"🤔 Raciocínio (DEBUG): {reasoning}")
+
+		if intent not in _VALID_INTENTS_SET:
+			# Última tentativa antes do default: procura qualquer rótulo válido
+			# no texto cru (cobre respostas tipo "The category is RISK.")
+			match = _INTENT_FALLBACK.search(content.upper())
+			intent = match.group(1) if match else "GREETING"
+			logger.log("intent_error", error="Invalid category", content=content, salvaged=intent)
+
 		return intent
 	except Exception as e:
 		logger.log("intent_critical_error", error=str(e))
 		return "GREETING"
 
-def _call_llm_sql(messages, user_query):
+# Roteamento de modelo por intenção: PROFILE e GENERAL são SELECTs bem
+# templatizados pelo prompt do especialista — o 7B quantizado (já exigido pelo
+# classificador) os resolve com ~2x o throughput do 14B. RISK/ABSENCE/HISTORY
+# (HAVING, NOT IN, ordenação) ficam no 14B; GREETING nem chega aqui (resposta
+# estática). A decisão é logada para revisão de acurácia a posteriori.
+_MODEL_FOR_INTENT = {
+	"PROFILE": MODEL_NAME_INTENT,
+	"GENERAL": MODEL_NAME_INTENT,
+}
+
+def _call_llm_sql(messages, user_query, model=MODEL_NAME_LOGIC):
 	"""
 	Helper genérico para os Geradores de SQL.
 	- Adiciona a query do usuário.
-	- Chama a LLM.
+	- Chama a LLM (o modelo vem roteado por intenção).
 	- Extrai e limpa o bloco de código SQL.
 	- Valida se o output parece SQL (começa com SELECT/WITH).
 	"""
 	messages.append({"role": "user", "content": user_query})
 	try:
 		response = call_llm(
-			model=MODEL_NAME, 
-			messages=messages, 
-			options={"temperature": 0.1},
+			model=model,
+			messages=messages,
+			options=_OPTS_SQL,
 			component="sql_generator"
 		)
 		content = response['message']['content'].strip()
+
+		# Caso comum (sem fence): nem toca no regex
+		if "```" not in content:
+			cleaned = content
+		else:
+			# Regex to extract code block if present. O SQL extraído do fence
+			# SEGUE para a validação abaixo — sem retorno antecipado, senão o
+			# caso mais comum (output cercado) escaparia do check de leitura.
+			match = _SQL_FENCE.search(content) or _ANY_FENCE.search(content)
+			if match:
+				cleaned = match.group(1).strip()
+			else:
+				# Fallback: strict cleanup if no code block
+				cleaned = content.replace("```sql", "").replace("```", "").strip()
 		
-		# Regex to extract code block if present
-		match = re.search(r"```sql\s*(.*?)\s*```", content, re.DOTALL | re.IGNORECASE)
-		if match:
-			return match.group(1).strip()
-		
-		# Fallback: check for generic code block
-		match = re.search(r"```\s*(.*?)\s*```", content, re.DOTALL)
-		if match:
-			return match.group(1).strip()
-			 
-		# Fallback: strict cleanup if no code block
-		cleaned = content.replace("```sql", "").replace("```", "").strip()
-		
-		# Validation: Ensure it looks like SQL
-		if not cleaned.upper().startswith("SELECT") and not cleaned.upper().startswith("WITH"):
+		# Validation: leitura válida e sem verbos destrutivos
+		if not _is_safe_select(cleaned):
 			print(content)
-			return "SELECT 'Error: Model generated text instead of SQL' WHERE 0"
-			
+			raise SQLGenerationError("Generated SQL failed the read-only check")
+
 		return cleaned
+	except SQLGenerationError:
+		raise
 	except Exception as e:
-		return f"Error: {e}"
+		# Exceção tipada no lugar de strings "Error: ..." — o scan de substring
+		# nos chamadores dava falso positivo em SQL legítimo contendo "Error"
+		raise SQLGenerationError(str(e)) from e
 
 # --- SQL GENERATORS ---
 
-def generate_profile_sql(user_query, schema):
-	"""
-	Especialista em PERFIL (Visão 360). Foca em joins precisos para trazer dados cadastrais + contratuais + última interação.
-	"""
-	system_prompt = f"""# ROLE
+# Prompts dos especialistas como templates de módulo, renderizados UMA vez com
+# o schema (memoização em _render_sql_prompt). Além de poupar o format por
+# chamada, o prompt fica idêntico byte a byte entre chamadas — pré-requisito
+# para o reuso de prefixo no KV cache do Ollama.
+_PROFILE_SQL_TMPL = """# ROLE
 	Expert SQL Data Scientist (Profile Specialist).
 
 	# GOAL
@@ -315,7 +744,7 @@ def generate_profile_sql(user_query, schema):
 	   - CALCULATED COLUMN: `CAST(julianday('now') - julianday(MAX(interacoes.data)) AS INTEGER)` AS dias_desde_ultima_interacao.
 	4. FILTER:
 	   - Where `clientes.nome` matches the 'Name' (no case sensitive).
-	5. CRITICAL: Handle case sensitivity by converting columns to lower case for comparisons. 
+	5. CRITICAL: Handle case sensitivity by converting columns to lower case for comparisons.
 	   - Example: Use `LIKE` operator.
 
 	# RULES
@@ -324,14 +753,27 @@ def generate_profile_sql(user_query, schema):
 	3. Answer strictly based on the provided text. Do not use outside knowledge or hallucinate facts. If the answer is not present, output is empty `[]`.
 	4. Ensure handle case sensitivity by converting columns to lower case.
 	"""
-	messages = [{"role": "system", "content": system_prompt}]
-	return _call_llm_sql(messages, user_query)
 
-def generate_history_sql(user_query, schema):
+def generate_sql(intent, user_query, schema=None):
 	"""
-	Especialista em HISTÓRICO. Foca em listar eventos ordenados cronologicamente.
+	Gerador único de SQL: um lookup no dicionário de prompts pré-renderizados
+	no lugar da cadeia de elif de especialistas. Intenções sem especialista
+	caem no GENERAL.
 	"""
-	system_prompt = f"""# ROLE
+	if intent not in _SQL_PROMPT_TEMPLATES or intent == "COMBINED":
+		intent = "GENERAL"
+	model = _MODEL_FOR_INTENT.get(intent, MODEL_NAME_LOGIC)
+	logger.log("model_route", intent=intent, model=model)
+	messages = [{"role": "system", "content": _render_sql_prompt(intent)}]
+	return _call_llm_sql(messages, user_query, model=model)
+
+def generate_profile_sql(user_query, schema):
+	"""
+	Especialista em PERFIL (Visão 360). Foca em joins precisos para trazer dados cadastrais + contratuais + última interação.
+	"""
+	return generate_sql("PROFILE", user_query, schema)
+
+_HISTORY_SQL_TMPL = """# ROLE
 	Expert SQL Data Scientist (History Specialist).
 
 	# GOAL
@@ -357,15 +799,14 @@ def generate_history_sql(user_query, schema):
 	3. Answer strictly based on the provided text. Do not use outside knowledge or hallucinate facts. If the answer is not present, output is empty `[]`.
 	4. Ensure handle case sensitivity by converting columns to lower case.
 	"""
-	messages = [{"role": "system", "content": system_prompt}]
-	return _call_llm_sql(messages, user_query)
 
-def generate_risk_sql(user_query, schema):
+def generate_history_sql(user_query, schema):
 	"""
-	Especialista em RISCO.Gera queries analíticas. Não julga o risco no SQL, mas extrai as métricas (dias para expirar, dias de silêncio)
-	para que o Analista (na próxima etapa) faça o julgamento subjetivo.
+	Especialista em HISTÓRICO. Foca em listar eventos ordenados cronologicamente.
 	"""
-	system_prompt = f"""# ROLE
+	return generate_sql("HISTORY", user_query, schema)
+
+_RISK_SQL_TMPL = """# ROLE
 	Expert SQL Data Scientist (Risk Specialist).
 
 	# GOAL
@@ -391,15 +832,15 @@ def generate_risk_sql(user_query, schema):
 	3. Answer strictly based on the provided text. Do not use outside knowledge or hallucinate facts. If the answer is not present, output is empty `[]`.
 	4. Ensure handle case sensitivity by converting columns to lower case.
 	"""
-	messages = [{"role": "system", "content": system_prompt}]
-	return _call_llm_sql(messages, user_query)
 
-def generate_absence_sql(user_query, schema):
+def generate_risk_sql(user_query, schema):
 	"""
-	Especialista em AUSÊNCIA/SILÊNCIO.
-	Lida com "lógica negativa" (NOT IN), que é difícil para LLMs generalistas.
+	Especialista em RISCO.Gera queries analíticas. Não julga o risco no SQL, mas extrai as métricas (dias para expirar, dias de silêncio)
+	para que o Analista (na próxima etapa) faça o julgamento subjetivo.
 	"""
-	system_prompt = f"""# ROLE
+	return generate_sql("RISK", user_query, schema)
+
+_ABSENCE_SQL_TMPL = """# ROLE
 	Expert SQL Data Scientist (Absence Specialist).
 
 	# GOAL
@@ -425,15 +866,15 @@ def generate_absence_sql(user_query, schema):
 	3. Answer strictly based on the provided text. Do not use outside knowledge or hallucinate facts. If the answer is not present, output is empty `[]`.
 	4. Ensure handle case sensitivity by converting columns to lower case.
 	"""
-	messages = [{"role": "system", "content": system_prompt}]
-	return _call_llm_sql(messages, user_query)
 
-def generate_general_sql(user_query, schema):
+def generate_absence_sql(user_query, schema):
 	"""
-	Especialista Generalista (Fallback).
-	Lida com agregações (Soma, Contagem) e buscas simples.
+	Especialista em AUSÊNCIA/SILÊNCIO.
+	Lida com "lógica negativa" (NOT IN), que é difícil para LLMs generalistas.
 	"""
-	system_prompt = f"""# ROLE
+	return generate_sql("ABSENCE", user_query, schema)
+
+_GENERAL_SQL_TMPL = """# ROLE
 	Expert SQL Data Scientist.
 
 	# GOAL
@@ -458,43 +899,162 @@ def generate_general_sql(user_query, schema):
 	3. Answer strictly based on the provided text. Do not use outside knowledge or hallucinate facts. If the answer is not present, output is empty `[]`.
 	4. Ensure handle case sensitivity by converting columns to lower case.
 	"""
-	messages = [{"role": "system", "content": system_prompt}]
-	return _call_llm_sql(messages, user_query)
+
+def generate_general_sql(user_query, schema):
+	"""
+	Especialista Generalista (Fallback).
+	Lida com agregações (Soma, Contagem) e buscas simples.
+	"""
+	return generate_sql("GENERAL", user_query, schema)
+
+_COMBINED_SQL_TMPL = """# ROLE
+	Expert SQL Data Scientist & Classifier for ClientaTech.
+
+	# GOAL
+	In ONE pass: classify the user's question AND generate the SQLite query for it.
+
+	# CONTEXT
+	Schema: {schema}
+
+	# CATEGORIES
+	1. PROFILE: Broad overview of one client. JOIN clientes + contratos + LEFT JOIN interacoes; include `CAST(julianday(contratos.data_fim) - julianday('now') AS INTEGER)` AS dias_para_expirar and `CAST(julianday('now') - julianday(MAX(interacoes.data)) AS INTEGER)` AS dias_desde_ultima_interacao; filter clientes.nome with LIKE (no case sensitive).
+	2. HISTORY: List of interactions/events. JOIN interacoes + clientes; fields data, tipo, descricao plus `CAST(julianday('now') - julianday(data) AS INTEGER)` AS dias_antes; most recent first.
+	3. RISK: Churn/risk inference. JOIN clientes + contratos (status 'Ativo'); select dias_para_expirar and dias_desde_ultima_interacao as above; apply HAVING thresholds when the user gives them.
+	4. ABSENCE: Negative logic ("sem interação", "sumiu"). Use NOT IN subquery on interacoes or clientes.status = 'Inativo'; include dias_desde_ultima_interacao.
+	5. GENERAL: Aggregations, financials, dates ("Faturamento"/"Valor" -> contratos.valor_mensal, "Vencimento" -> contratos.data_fim).
+	6. GREETING: Conversational/Meta ("Oi", "Ajuda", "O que você faz?"). No SQL needed — use null.
+
+	# OUTPUT FORMAT: JSON ONLY.
+	{{
+		"category": "Category Name",
+		"sql": "SELECT ... (or null for GREETING)"
+	}}
+
+	# RULES
+	1. SQLite Syntax Only.
+	2. Output format MUST use the column names from the Schema (PT-BR). Only alias for calculated columns. Always use lower case column names.
+	3. Handle case sensitivity by converting columns to lower case (LIKE).
+	"""
+
+_SQL_PROMPT_TEMPLATES = {
+	"PROFILE": _PROFILE_SQL_TMPL,
+	"HISTORY": _HISTORY_SQL_TMPL,
+	"RISK": _RISK_SQL_TMPL,
+	"ABSENCE": _ABSENCE_SQL_TMPL,
+	"GENERAL": _GENERAL_SQL_TMPL,
+	"COMBINED": _COMBINED_SQL_TMPL,
+}
+
+@functools.lru_cache(maxsize=None)
+def _render_sql_prompt(intent):
+	"""
+	System prompt pré-renderizado por intenção. O schema é estável em runtime,
+	então cada prompt é formatado uma única vez por processo — os geradores
+	só buscam a string pronta.
+	"""
+	return _SQL_PROMPT_TEMPLATES[intent].format(schema=get_schema())
+
+def generate_intent_and_sql(user_query, schema):
+	"""
+	Caminho rápido: classifica a intenção E gera o SQL em UMA única chamada.
+	Economiza um round-trip inteiro (rede + prefill) por pergunta não cacheada.
+	Retorna (sql, intent), ou None se a resposta vier malformada — nesse caso
+	o roteador cai no caminho clássico em duas etapas.
+	"""
+	try:
+		response = call_llm(
+			model=MODEL_NAME_LOGIC,
+			messages=[
+				{"role": "system", "content": _render_sql_prompt("COMBINED")},
+				{"role": "user", "content": user_query}
+			],
+			options=_OPTS_COMBINED,
+			component="intent_sql_combined"
+		)
+		content = response['message']['content'].strip()
+
+		if "```json" in content:
+			match = _JSON_FENCE.search(content)
+			if match: content = match.group(1)
+
+		data = _json_loads(content)
+		intent = str(data.get("category", "")).strip().upper()
+		if intent not in _VALID_INTENTS_SET:
+			return None
+
+		if intent == "GREETING":
+			return None, "GREETING"
+
+		sql = (data.get("sql") or "").strip()
+		if not _is_safe_select(sql):
+			return None
+
+		return sql, intent
+	except Exception as e:
+		logger.log("combined_call_error", error=str(e))
+		return None
 
 def generate_sql_router(user_query, schema):
 	"""
 	Função Orquestradora do Router de SQL. Conecta o Intent Classifier aos Geradores.
 	"""
-	
+
+	# Embedding em background: roda em paralelo com o lookup exato e, num miss
+	# total, com a própria chamada ao LLM — o resultado é colhido onde precisar
+	embed_future = _EMBED_POOL.submit(_embed, user_query)
+
 	# Verifica Cache (Performance First)
-	cached = get_cache(user_query)
+	cached = get_cache(user_query, embed_future)
 	if cached:
 		print(f"⚡ Cache Hit! (Intent: {cached['intent']})")
 		logger.log("cache_hit", intent=cached['intent'], query=user_query)
 		return cached['sql_generated'], cached['intent']
 
-	# Logic (Roteamento + Generator)
+	# Degrau mais barato da escada primeiro: se as regras resolvem a intenção
+	# em ~µs, nada de gastar a chamada combinada de 14B (saudação nem gera SQL)
+	intent = _fast_classify(user_query)
+	if intent == "GREETING":
+		return None, "GREETING"
+	if intent is not None:
+		print(f"🧠 Intenção Detectada: {intent} (rule)")
+		try:
+			sql = generate_sql(intent, user_query, schema)
+		except SQLGenerationError as e:
+			logger.log("sql_generation_error", intent=intent, error=str(e))
+			return None, "ERROR"
+		logger.log("sql_generated", sql=sql, intent=intent)
+		save_cache(user_query, sql, intent, query_vector=embed_future.result())
+		return sql, intent
+
+	# Fast Path: intenção + SQL em uma chamada só
+	combined = generate_intent_and_sql(user_query, schema)
+	if combined is not None:
+		sql, intent = combined
+		print(f"🧠 Intenção Detectada: {intent} (combined)")
+		logger.log("intent_route", intent=intent, query=user_query, mode="combined")
+		if intent == "GREETING":
+			return None, "GREETING"
+		logger.log("sql_generated", sql=sql, intent=intent)
+		save_cache(user_query, sql, intent, query_vector=embed_future.result())
+		return sql, intent
+
+	# Fallback: caminho clássico em duas etapas (Roteamento + Generator)
 	intent = classify_intent(user_query)
 	print(f"🧠 Intenção Detectada: {intent}")
 	logger.log("intent_route", intent=intent, query=user_query)
 	
-	if intent == "PROFILE":
-		sql = generate_profile_sql(user_query, schema)
-	elif intent == "HISTORY":
-		sql = generate_history_sql(user_query, schema)
-	elif intent == "RISK":
-		sql = generate_risk_sql(user_query, schema)
-	elif intent == "ABSENCE":
-		sql = generate_absence_sql(user_query, schema)
-	elif intent == "GREETING":
+	if intent == "GREETING":
 		return None, "GREETING"
-	else:
-		sql = generate_general_sql(user_query, schema)
-		
+	try:
+		sql = generate_sql(intent, user_query, schema)
+	except SQLGenerationError as e:
+		logger.log("sql_generation_error", intent=intent, error=str(e))
+		return None, "ERROR"
+
 	logger.log("sql_generated", sql=sql, intent=intent)
 	
 	# Save Cache (if valid!)
-	save_cache(user_query, sql, intent)
+	save_cache(user_query, sql, intent, query_vector=embed_future.result())
 	return sql, intent
 
 
@@ -503,29 +1063,33 @@ def generate_sql_router(user_query, schema):
 def execute_sql(sql_query):
 	"""
 	Executa o SQL gerado no banco físico.
-	Usa fetchall para recuperar dados e converte para lista de dicionários (JSON-friendly).
+	Retorna formato colunar {"columns": [...], "rows": [[...], ...]}: um dict
+	por resultado em vez de um por linha (nomes de coluna não se repetem por
+	linha, e a serialização para o prompt do Analista fica mais enxuta).
 	"""
-	start_time = datetime.now()
+	if not _is_safe_select(sql_query):
+		logger.log("sql_execution", status="blocked", sql=sql_query)
+		return None, "SQL bloqueado pela pré-validação (somente leitura)"
+
+	t0 = time.perf_counter_ns()
 	try:
 		conn = get_db_connection()
 		cursor = conn.cursor()
 		cursor.execute(sql_query)
-		res = cursor.fetchall()
-		result = [dict(row) for row in res]
-		conn.close()
-		
-		end_time = datetime.now()
-		duration_ms = (end_time - start_time).total_seconds() * 1000
+		columns = [d[0] for d in cursor.description] if cursor.description else []
+		rows = [tuple(row) for row in cursor.fetchall()]
+		result = {"columns": columns, "rows": rows}
+
+		duration_ms = (time.perf_counter_ns() - t0) / 1_000_000
 		logger.log(
 			event_type="sql_execution",
 			duration_ms=round(duration_ms, 2),
-			rows=len(result),
+			rows=len(rows),
 			status="success"
 		)
 		return result, None
 	except Exception as e:
-		end_time = datetime.now()
-		duration_ms = (end_time - start_time).total_seconds() * 1000
+		duration_ms = (time.perf_counter_ns() - t0) / 1_000_000
 		logger.log(
 			event_type="sql_execution",
 			duration_ms=round(duration_ms, 2),
@@ -537,42 +1101,41 @@ def execute_sql(sql_query):
 
 # --- ANALYST PERSONA (RESPONSE GENERATION) ---
 
+@functools.lru_cache(maxsize=4)
 def load_few_shot_examples(n=5):
-	"""Helper to load examples (currently unused but preserved)."""
-	examples_text = ""
+	"""
+	Helper to load examples (currently unused but preserved).
+	Memoizado por n e lido com islice: o arquivo é percorrido uma vez até a
+	linha n, sem carregar o dataset inteiro em memória.
+	"""
+	parts = []
 	try:
-		import random
 		with open(FT_PATH, 'r', encoding='utf-8') as f:
-			lines = f.readlines()
-			for line in lines[:n]: 
-				data = json.loads(line)
+			for line in itertools.islice(f, n):
+				data = _json_loads(line)
 				user = data['messages'][1]['content']
 				assistant = data['messages'][2]['content']
-				examples_text += f"\nUser Input: {user}\nAssistant Response:\n{assistant}\n---\n"
+				parts.append(f"\nUser Input: {user}\nAssistant Response:\n{assistant}\n---\n")
 	except:
 		pass
-	return examples_text
-
-def generate_final_response(user_query, sql_query, sql_result, intent):
-	"""
-	O 'Analista' final. Pega os dados estruturados (SQL Result) e os transforma em uma resposta humana.
-	O Prompt muda dinamicamente baseado na INTENÇÃO (Style Guide).
-	"""
-	today = datetime.now().strftime('%Y-%m-%d')
-	# dynamic_examples = load_few_shot_examples(n=10) # Load diverse examples
-	
-	system_prompt = f"""# ROLE
+	return "".join(parts)
+
+# System prompt do Analista especializado por intenção: o prefill é linear no
+# tamanho do prompt, e só um bloco de formatação importa por chamada. Cada
+# intenção recebe cabeçalho + SEU bloco + regras compartilhadas, montados uma
+# vez no import — cada prompt continua idêntico byte a byte entre chamadas, o
+# que mantém o reuso de prefixo no KV cache do Ollama (um prefixo por intenção).
+_ANALYST_HEADER = """# ROLE
 	ClientaTech AI Analyst.
 
 	# GOAL
-	Answer a user query based on SQL data.
-
-	# CONTEXT
-	MODE: {intent}
-	CURRENT_DATE: {today}
+	Answer a user query based on SQL data. The MODE and CURRENT_DATE come in the user message.
 
 	# INSTRUCTIONS
-	- IF MODE == 'PROFILE': 
+"""
+
+_ANALYST_MODE_BLOCKS = {
+	"PROFILE": """	- IF MODE == 'PROFILE':
 		1. You MUST use the "Rich Profile Card" style (Status, Plan, Value + Observations).
 		2. You can use emojis to make the response more engaging.
 		Example:
@@ -584,50 +1147,139 @@ def generate_final_response(user_query, sql_query, sql_result, intent):
 		ℹ️ Observações:
 		* [Observation 1, e.g., "Contrato active until..."]
 		* [Observation 2, e.g., "Last interaction was..."]
-	- IF MODE == 'HISTORY': 
+""",
+	"HISTORY": """	- IF MODE == 'HISTORY':
 		- You MUST use a Bulleted List of events.
 		- FORMAT: "Date - Description (X days ago)".
-	- IF MODE == 'RISK': 
+""",
+	"RISK": """	- IF MODE == 'RISK':
 		1. LOGIC: Risk = (dias_para_expirar < X) days OR (dias_desde_ultima_interacao > Y) days.
 		2. SUBJECTIVITY HANDLING:
 			- If user asks for "Bons/Melhores": Show clients with NO Risk (Active + Safe dates).
 			- If user asks for "Ruins/Piores": Show clients WITH Risk.
 		3. ALWAYS explicitly the criteria used to determine the risk.
 		4. OUTPUT: List clients based on these logical criteria.
-	- IF MODE == 'ABSENCE': 
+""",
+	"ABSENCE": """	- IF MODE == 'ABSENCE':
 		1. List the clients found.
 		2. Mention `dias_desde_ultima_interacao` explicitly (e.g. "Sem contato há X dias").
-	- IF MODE == 'GENERAL': Answer directly and concisely.
-	- IF MODE == 'GREETING': 
+""",
+	"GENERAL": """	- IF MODE == 'GENERAL': Answer directly and concisely.
+""",
+	"GREETING": """	- IF MODE == 'GREETING':
 		1. Introduce yourself as "ClientaTech AI Analyst".
 		2. Briefly explain what you can do (Analyze Clients/Companies Profiles, History, Risk, and General Data).
 		3. Give 3 examples of short questions the user can ask.
 		4. Be professional but welcoming.
+""",
+}
 
+_ANALYST_RULES = """
 	# RULES
 	1. OUTPUT LANGUAGE: Portuguese (pt-BR).
-	2. TRUTH: If data is empty `[]`, say "Não encontrei informações" (Except for GREETING).
+	2. TRUTH: If "rows" is empty, say "Não encontrei informações" (Except for GREETING).
 	3. TONE: Professional. Can use emojis to make the response more engaging.
 	4. LOOK for calculated columns in the SQL result (e.g. 'dias_para_expirar', 'dias_desde_ultima_interacao') to explain timestamps.
 	"""
-	# EXAMPLES:
-    # {dynamic_examples}
-	
+
+_ANALYST_PROMPTS = {
+	intent: _ANALYST_HEADER + block + _ANALYST_RULES
+	for intent, block in _ANALYST_MODE_BLOCKS.items()
+}
+
+def _analyst_system_prompt(intent):
+	"""Prompt do Analista para a intenção (intenções desconhecidas caem no GENERAL)."""
+	return _ANALYST_PROMPTS.get(intent, _ANALYST_PROMPTS["GENERAL"])
+
+# Saudações não precisam de LLM: a resposta é um texto de ajuda estático.
+# Três variantes pré-escritas dão alguma variedade sem pagar um decode inteiro.
+_GREETING_TEMPLATES = [
+	"""👋 Olá! Eu sou o **ClientaTech AI Analyst**.
+
+Posso analisar perfis de clientes, histórico de interações, risco de churn e dados gerais de contratos.
+
+Experimente perguntar:
+* "Me fale sobre a TechSolutions"
+* "Quais clientes estão em risco?"
+* "Quais contratos vencem este mês?\"""",
+	"""🤖 Oi! **ClientaTech AI Analyst** à disposição.
+
+Consulto a base de clientes da ClientaTech: perfis, interações, sinais de risco e números de contratos.
+
+Alguns exemplos:
+* "Histórico da MegaVarejo"
+* "Clientes sem interação há 30 dias"
+* "Qual o faturamento total?\"""",
+	"""💼 Bem-vindo! Eu sou o **ClientaTech AI Analyst**.
+
+Respondo perguntas sobre perfis de empresas, histórico de contato, risco de churn e valores de contrato.
+
+Você pode perguntar:
+* "Status da SaudeMais"
+* "Quem está em risco de churn?"
+* "Quais vencimentos estão próximos?\"""",
+]
+
+def greeting_response():
+	"""Resposta de saudação sem chamada ao LLM (decode é a fase cara)."""
+	logger.log("greeting_template", source="static")
+	return random.choice(_GREETING_TEMPLATES)
+
+def _analyst_messages(user_query, sql_query, sql_result, intent):
+	"""Monta as mensagens do Analista (compartilhado entre o modo normal e o streaming)."""
+	today = datetime.now().strftime('%Y-%m-%d')
+	# dynamic_examples = load_few_shot_examples(n=10) # Load diverse examples
+
 	user_content = f"""
+	MODE: {intent}
+	CURRENT_DATE: {today}
 	User Query: {user_query}
 	SQL Used: {sql_query}
-	Data Retrieved: {json.dumps(sql_result, ensure_ascii=False)}
-	
+	Data Retrieved (JSON object with "columns" and "rows" arrays): {_json_dumps_sorted(sql_result)}
+
 	Generate response for mode {intent}.
 	"""
-	
+	return [
+		{"role": "system", "content": _analyst_system_prompt(intent)},
+		{"role": "user", "content": user_content}
+	]
+
+# Pool dedicado ao pré-aquecimento do Analista (1 worker: nunca há mais de um
+# prime útil em voo por vez)
+_PRIME_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="prime")
+
+def _prime_analyst(intent):
+	"""
+	Pré-aquece o prefill do Analista: manda só o system prompt da intenção com
+	num_predict=1. O Ollama guarda o prefixo no KV cache, então a chamada real
+	logo em seguida não paga o prefill do system prompt de novo. A API de chat
+	não permite "anexar" os dados a uma requisição aberta — o reuso de prefixo
+	dá o mesmo efeito de sobrepor o prefill com a execução do SQL.
+	"""
+	try:
+		client.chat(
+			model=MODEL_NAME,
+			messages=[{"role": "system", "content": _analyst_system_prompt(intent)}],
+			options={"num_predict": 1},
+			keep_alive=KEEP_ALIVE
+		)
+	except Exception as e:
+		logger.log("analyst_prime_error", error=str(e))
+
+def prime_analyst_async(intent):
+	"""Dispara o pré-aquecimento em background e retorna o future (join antes do Analista)."""
+	return _PRIME_POOL.submit(_prime_analyst, intent)
+
+def generate_final_response(user_query, sql_query, sql_result, intent):
+	"""
+	O 'Analista' final. Pega os dados estruturados (SQL Result) e os transforma em uma resposta humana.
+	O Prompt muda dinamicamente baseado na INTENÇÃO (Style Guide), via mensagem de usuário.
+	"""
 	try:
 		response = call_llm(
 			model=MODEL_NAME,
-			messages=[
-				{"role": "system", "content": system_prompt},
-				{"role": "user", "content": user_content}
-			],
+			messages=_analyst_messages(user_query, sql_query, sql_result, intent),
+			options=_OPTS_ANALYST,
 			component="analyst_response"
 		)
 		final_text = response['message']['content']
@@ -636,6 +1288,133 @@ def generate_final_response(user_query, sql_query, sql_result, intent):
 		logger.log("analyst_error", error=str(e))
 		return f"Error response: {e}"
 
+def generate_final_response_stream(user_query, sql_query, sql_result, intent):
+	"""
+	Versão streaming do Analista: produz o texto em pedaços para exibição
+	incremental. O chamador decide como renderizar (stdout, Streamlit, etc.).
+	"""
+	try:
+		yield from call_llm_stream(
+			model=MODEL_NAME,
+			messages=_analyst_messages(user_query, sql_query, sql_result, intent),
+			options=_OPTS_ANALYST,
+			component="analyst_response"
+		)
+	except Exception as e:
+		logger.log("analyst_error", error=str(e))
+		yield f"Error response: {e}"
+
+
+# --- BATCH / CONCURRENT MODE ---
+
+def process_query(user_query, schema):
+	"""
+	Pipeline completo (Router -> Execução -> Analista) para UMA pergunta.
+	Retorna o texto final da resposta (ou a mensagem de erro).
+	"""
+	sql_query, intent = generate_sql_router(user_query, schema)
+
+	if intent == "GREETING":
+		return greeting_response()
+
+	if sql_query is None:
+		return "❌ Não consegui gerar a consulta para essa pergunta."
+
+	# Prefill do Analista em paralelo com a execução do SQL
+	prime = prime_analyst_async(intent)
+	result, error = execute_sql(sql_query)
+	if error:
+		return f"❌ Erro na execução: {error}"
+
+	prime.result()
+	return generate_final_response(user_query, sql_query, result, intent)
+
+async def process_queries(queries, schema=None):
+	"""
+	Processa várias perguntas concorrentemente (modo eval/replay do dataset).
+	O pipeline em si continua síncrono — app_ui.py e o REPL dependem da API
+	bloqueante — então cada pergunta roda numa thread via asyncio.to_thread.
+	Como o custo é I/O de HTTP contra o Ollama, o overlap escala até
+	OLLAMA_NUM_PARALLEL requisições simultâneas no servidor.
+	"""
+	if schema is None:
+		schema = get_schema()
+	return await asyncio.gather(*[
+		asyncio.to_thread(process_query, query, schema) for query in queries
+	])
+
+# Lote: contexto maior e teto de saída proporcional a N perguntas por chamada
+_OPTS_SQL_BATCH = {"temperature": 0.1, "num_ctx": 4096, "num_predict": 2048}
+_BATCH_SQL_FORMAT = {"type": "array", "items": {"type": "string"}}
+
+def run_batch(queries):
+	"""
+	Gera SQL para várias perguntas amortizando o prefill (modo eval/replay):
+	- cache primeiro, com a mesma semântica do roteador por pergunta;
+	- os misses são agrupados por intenção e cada grupo vira UMA chamada com
+	  as perguntas numeradas, pedindo uma lista JSON de SQLs na mesma ordem.
+	Qualquer resposta malformada cai no caminho clássico pergunta a pergunta.
+	Retorna lista de (sql, intent) na ordem de entrada.
+	"""
+	results = [None] * len(queries)
+	schema = get_schema()
+
+	misses = []
+	for i, query in enumerate(queries):
+		cached = get_cache(query)
+		if cached:
+			logger.log("cache_hit", intent=cached['intent'], query=query)
+			results[i] = (cached['sql_generated'], cached['intent'])
+		else:
+			misses.append(i)
+
+	groups = {}
+	for i in misses:
+		intent = classify_intent(queries[i])
+		if intent == "GREETING":
+			results[i] = (None, "GREETING")
+		else:
+			groups.setdefault(intent, []).append(i)
+
+	for intent, idxs in groups.items():
+		numbered = "\n".join(f"{n}. {queries[i]}" for n, i in enumerate(idxs, 1))
+		user_content = (
+			f"Generate ONE SQLite query for EACH numbered question below.\n"
+			f"Reply with a JSON array of exactly {len(idxs)} SQL strings, same order, no prose.\n\n"
+			f"{numbered}"
+		)
+		try:
+			response = call_llm(
+				model=_MODEL_FOR_INTENT.get(intent, MODEL_NAME_LOGIC),
+				messages=[
+					{"role": "system", "content": _render_sql_prompt(intent)},
+					{"role": "user", "content": user_content}
+				],
+				options=_OPTS_SQL_BATCH,
+				component="sql_batch",
+				format=_BATCH_SQL_FORMAT
+			)
+			sqls = _json_loads(response['message']['content'])
+		except Exception as e:
+			logger.log("batch_error", intent=intent, error=str(e))
+			sqls = None
+
+		if not isinstance(sqls, list) or len(sqls) != len(idxs):
+			for i in idxs:
+				results[i] = generate_sql_router(queries[i], schema)
+			continue
+
+		for i, sql in zip(idxs, sqls):
+			sql = (sql or "").strip()
+			if _is_safe_select(sql):
+				logger.log("sql_generated", sql=sql, intent=intent, mode="batch")
+				save_cache(queries[i], sql, intent)
+				results[i] = (sql, intent)
+			else:
+				results[i] = generate_sql_router(queries[i], schema)
+
+	return results
+
 
 # --- MAIN APPLICATION LOOP ---
 
@@ -643,8 +1422,10 @@ def main():
 	print(f"🤖 **ClientaTech AI Agent [Router Architecture]** initialized.")
 	
 	# Initialize Infrastructure
-	init_cache()
+	init_db()
 	schema = get_schema()
+	print("⏳ Aquecendo modelos (evita cold-start na 1ª pergunta)...")
+	warmup_models()
 	
 	while True:
 		try:
@@ -658,30 +1439,33 @@ def main():
 			sql_query, intent = generate_sql_router(user_query, schema)
 			
 			if intent == "GREETING":
-				final_response = generate_final_response(user_query, "SKIP", [], intent)
-				print(f"\n{final_response}")
+				print(f"\n{greeting_response()}")
 				continue
 			
-			if "Error" in sql_query:
-				print(f"❌ {sql_query}")
+			if sql_query is None:
+				print("❌ Não consegui gerar a consulta para essa pergunta.")
 				continue
 				
 			print(f"🔍 SQL (Intenção: {intent}): {sql_query}")
 			
-			# Step 3: Execute
+			# Step 3: Execute (com o prefill do Analista aquecendo em paralelo)
 			print("⏳ Executando...")
+			prime = prime_analyst_async(intent)
 			result, error = execute_sql(sql_query)
 			
 			if error:
 				print(f"❌ Erro na execução: {error}")
 				continue
 			
-			print(f"📊 Resultados encontrados: {len(result) if result else 0}")
+			print(f"📊 Resultados encontrados: {len(result['rows']) if result else 0}")
 			
-			# Step 4: Analyst
-			print("⏳ Formatando resposta...")
-			final_response = generate_final_response(user_query, sql_query, result, intent)
-			print(f"\n{final_response}")
+			# Step 4: Analyst (streaming: tokens aparecem conforme são gerados)
+			print("⏳ Formatando resposta...\n")
+			prime.result()
+			for chunk in generate_final_response_stream(user_query, sql_query, result, intent):
+				sys.stdout.write(chunk)
+				sys.stdout.flush()
+			print()
 			
 		except KeyboardInterrupt:
 			break
@@ -1,6 +1,5 @@
 import streamlit as st
 import agent
-import uuid
 
 # Page Config
 st.set_page_config(
@@ -12,28 +11,49 @@ st.set_page_config(
 # Initialize Backend Infrastructure
 agent.init_cache()
 
+# Warmup uma única vez por processo (cache_resource sobrevive aos reruns):
+# carrega os modelos no Ollama com keep_alive para a 1ª pergunta não pagar o
+# cold-start de dezenas de segundos do 14B.
+@st.cache_resource
+def _warmup_once():
+    agent.warmup_models()
+    return True
+
+_warmup_once()
+
+# Schema é estático por processo: resolve uma vez no load do script em vez de
+# a cada mensagem dentro do handler do chat (o lru_cache do agent já absorve
+# os reruns do Streamlit).
+SCHEMA = agent.get_schema()
+
 # --- 1. GERENCIAMENTO DE ESTADO & SEGURANÇA ---
 
-# Inicializa o dicionário de chats
+# Inicializa o dicionário de chats. IDs são um contador monotônico (O(1) de
+# alocar, sem os 128 bits aleatórios + hex do uuid4) e chat_order mantém a
+# ordem de criação explícita — a sidebar itera essa lista em vez de
+# rematerializar list(chats.keys()) a cada rerun.
 if "chats" not in st.session_state:
-    initial_id = str(uuid.uuid4())
     st.session_state.chats = {
-        initial_id: {"title": "Nova Conversa", "messages": []}
+        0: {"title": "Nova Conversa", "messages": []}
     }
-    st.session_state.current_chat_id = initial_id
+    st.session_state.chat_order = [0]
+    st.session_state.next_chat_id = 1
+    st.session_state.current_chat_id = 0
 
 # Inicializa o ID atual (caso não exista)
 if "current_chat_id" not in st.session_state:
-    st.session_state.current_chat_id = list(st.session_state.chats.keys())[0]
+    st.session_state.current_chat_id = st.session_state.chat_order[0]
 
 # SAFETY CHECK: Garante que o chat atual realmente existe no dicionário
 # (Previne erros se um chat for deletado ou o estado corrompido)
 if st.session_state.current_chat_id not in st.session_state.chats:
-    st.session_state.current_chat_id = list(st.session_state.chats.keys())[0]
+    st.session_state.current_chat_id = st.session_state.chat_order[0]
 
 def create_new_chat():
-    new_id = str(uuid.uuid4())
+    new_id = st.session_state.next_chat_id
+    st.session_state.next_chat_id = new_id + 1
     st.session_state.chats[new_id] = {"title": "Nova Conversa", "messages": []}
+    st.session_state.chat_order.append(new_id)
     st.session_state.current_chat_id = new_id
 
 # --- 2. SIDEBAR (Layout Refinado) ---
@@ -55,11 +75,8 @@ with st.sidebar:
     # Cabeçalho do Histórico
     st.subheader("📜 Histórico")
     
-    # Lista de Conversas
-    chat_ids = list(st.session_state.chats.keys())
-    
-    # Loop reverso para conversas novas no topo
-    for chat_id in reversed(chat_ids):
+    # Loop reverso sobre a ordem de criação para conversas novas no topo
+    for chat_id in reversed(st.session_state.chat_order):
         chat_data = st.session_state.chats[chat_id]
         
         # LÓGICA VISUAL: 
@@ -72,7 +89,7 @@ with st.sidebar:
         icon = "📂" if is_active else "💬"
         label = f"{icon} {chat_data['title']}"
         
-        if st.button(label, key=chat_id, use_container_width=True, type=button_type):
+        if st.button(label, key=f"chat_{chat_id}", use_container_width=True, type=button_type):
             st.session_state.current_chat_id = chat_id
             st.rerun()
 
@@ -133,24 +150,27 @@ if prompt := st.chat_input("Digite sua pergunta de negócio aqui..."):
         generated_sql = None
         detected_intent = None
         final_response_text = ""
+        response_stream = None
 
         try:
             # Container de Status Expandido
             with st.status("🔍 **Analisando dados...**", expanded=True) as status_box:
                 
                 st.write("🧠 *Compreendendo contexto e gerando query...*")
-                schema = agent.get_schema()
-                generated_sql, detected_intent = agent.generate_sql_router(prompt, schema)
+                generated_sql, detected_intent = agent.generate_sql_router(prompt, SCHEMA)
                 
                 if detected_intent == "GREETING":
                      status_box.update(label="💬 **Conversando...**", state="complete", expanded=False)
-                     final_response_text = agent.generate_final_response(prompt, "SKIP", [], detected_intent)
+                     # Saudação usa o template estático — zero chamadas ao LLM
+                     final_response_text = agent.greeting_response()
                 
-                elif "Error" in generated_sql:
+                elif generated_sql is None:
                     status_box.update(label="❌ Falha no Raciocínio", state="error")
-                    final_response_text = f"Não consegui processar a lógica: {generated_sql}"
+                    final_response_text = "Não consegui processar a lógica para essa pergunta."
                 else:
                     st.write("⚙️ *Executando busca no banco de dados...*")
+                    # Prefill do Analista aquece em paralelo com a busca SQL
+                    prime = agent.prime_analyst_async(detected_intent)
                     result, error = agent.execute_sql(generated_sql)
                     
                     if error:
@@ -158,22 +178,29 @@ if prompt := st.chat_input("Digite sua pergunta de negócio aqui..."):
                         final_response_text = f"Erro técnico ao consultar dados: {error}"
                     else:
                         st.write("📝 *Sintetizando resposta executiva...*")
-                        final_response_text = agent.generate_final_response(prompt, generated_sql, result, detected_intent)
+                        prime.result()
+                        # Gerador preguiçoso: a chamada ao LLM só começa quando o
+                        # st.write_stream consumir os chunks, já fora do status box
+                        response_stream = agent.generate_final_response_stream(prompt, generated_sql, result, detected_intent)
                         status_box.update(label="✅ **Análise Concluída**", state="complete", expanded=False)
 
             # Exibe SQL gerado (se válido)
-            if generated_sql and "Error" not in generated_sql:
+            if generated_sql:
                 with st.expander(f"🧠 Ver Query SQL ({detected_intent})"):
                     st.code(generated_sql, language="sql")
             
-            # Exibe Resposta Final
-            st.markdown(final_response_text)
+            # Exibe Resposta Final (streaming quando há dados: tokens aparecem
+            # conforme chegam, em vez de esperar a resposta inteira)
+            if response_stream is not None:
+                final_response_text = st.write_stream(response_stream)
+            else:
+                st.markdown(final_response_text)
             
             # Salva no Histórico
             messages.append({
                 "role": "assistant", 
                 "content": final_response_text,
-                "sql": generated_sql if (generated_sql and "Error" not in generated_sql) else None,
+                "sql": generated_sql,
                 "intent": detected_intent
             })
             